@@ -1,91 +1,101 @@
-from flask import Flask, render_template, request, redirect
+import json
+import os
+import threading
+import uuid
+from collections import OrderedDict
+
+from flask import Flask, Response, render_template, request, redirect
 
 
 from src.cool_grammar import *
-from src.lr1 import LR1Parser, build_LR1_automaton
+from src.lr1 import warm_up
+from src.tables import TABLE_FILE
 from src.tokenizer import tokenize_text, get_tokens, get_errors
-from src.evaluations import evaluate_reverse_parse
 import src.tools.semantic as semantic
 from src.tools.utils import parse_tree_right
 
 from src.visitor.format_visitor import FormatVisitor
-from src.visitor.type_builder import TypeBuilder
-from src.visitor.type_collector import TypeCollector
-from src.visitor.type_checker import TypeChecker
-from src.visitor.autotype_visitor import AutoTypeVisitor
-from src.visitor.selftype_visitor import SelfTypeVisitor
-from src.visitor.var_collector import VarCollector
+from src.incremental import IncrementalAnalyzer
+import src.instrumentation as instrumentation
 
 
 app = Flask(__name__, )
 
+# Build the parsing tables while the server starts, so the first request
+# doesn't have to pay for the automaton construction.
+warm_up(G, table_file=TABLE_FILE, background=True)
+
+# Successive analyses of the same document only parse and check again the
+# classes affected by the last edit. Every document has its own analyzer,
+# the form sends its id back, and only the ones used last are kept
+MAX_DOCUMENTS = 64
+analyzers = OrderedDict()
+analyzers_lock = threading.Lock()
+
+def get_analyzer(document):
+    with analyzers_lock:
+        try:
+            analyzers.move_to_end(document)
+        except KeyError:
+            analyzers[document] = IncrementalAnalyzer(table_file=TABLE_FILE)
+            if len(analyzers) > MAX_DOCUMENTS:
+                analyzers.popitem(last=False)
+        return analyzers[document]
+
+# Set COOL_METRICS=1 to count and time the hot paths of every analysis. The
+# metrics of an analysis are shown with its result and the totals in /metrics
+if os.environ.get('COOL_METRICS'):
+    instrumentation.enable()
+
 @app.route('/')
 def index():
     return render_template('base.html')
 
-def execute_visitors(ast):
-    # COLLECTING TYPES
-    errors = [] 
-    collector = TypeCollector(errors)
-    collector.visit(ast)
-    context = collector.context
-    
-    # BUILDING TYPES
-    builder = TypeBuilder(context, errors)
-    builder.visit(ast)
-    
-    # VAR COLLECTOR
-    checker = VarCollector(context, errors)
-    scope = checker.visit(ast)
-    
-    # SELF TYPE
-    checker = SelfTypeVisitor(context, errors)
-    checker.visit(ast, scope)
-    
-    # AUTO TYPE
-    checker = AutoTypeVisitor(context, errors)
-    checker.visit(ast, scope)
-    
-    # CHECKING TYPES
-    checker = TypeChecker(context, errors)
-    checker.visit(ast, scope)
-    return context, scope, errors
-
-
 @app.route('/analysis/', methods=['GET', 'POST'])
 def analysis():
     text = request.form.get('text')
+    document = request.form.get('document') or uuid.uuid4().hex
+    analyzer = get_analyzer(document)
+    if not instrumentation.enabled():
+        return render_template('index.html', document=document, **analyze(text, analyzer))
+
+    with instrumentation.collect() as metrics:
+        result = analyze(text, analyzer)
+    return render_template('index.html', document=document, metrics=json.dumps(metrics.report(), indent=2), **result)
+
+
+def analyze(text, analyzer):
     errors = []
 
     # TOKENS
-    tokens = tokenize_text(text)
-    lex_errors = get_errors(tokens)
+    with instrumentation.timer('lexer'):
+        tokens = tokenize_text(text)
+        lex_errors = get_errors(tokens)
     if lex_errors:
-        return render_template('index.html', 
+        return dict(
                 text=text,
                 tokens=get_tokens(tokens),
                 lex_errors=lex_errors)
     
     # PARSER
-    parser = LR1Parser(G)
     try:
-        parse, operations = parser(tokens)
+        # AST, built while parsing
+        with instrumentation.timer('parser'):
+            ast = analyzer.parse(tokens)
     except Exception as e:
-        return render_template('index.html', 
+        return dict(
                     text=text,
                     tokens=get_tokens(tokens),
                     parser_errors=e.args[0])
-    # AST
-    ast = evaluate_reverse_parse(parse, operations, tokens)
     # parse_tree_right(parse).write_svg('parse_tree.svg')
     formatter = FormatVisitor()
     tree = formatter.visit(ast)
-    context, scope, errors = execute_visitors(ast)
+    with instrumentation.timer('semantic'):
+        context, scope, errors = analyzer.check(ast)
 
-    return render_template('index.html', 
+    return dict(
         text=text,
         tokens=get_tokens(tokens),
-        parse=parse,
         tree=formatter.visit(ast),
         context=context,
         errors=errors,
@@ -93,5 +103,12 @@ def analysis():
     )
 
 
+@app.route('/metrics')
+def metrics():
+    # Totals of the analyses made since the instrumentation was enabled, in
+    # the Prometheus text format
+    return Response(instrumentation.prometheus(), mimetype='text/plain; version=0.0.4')
+
+
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
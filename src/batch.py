@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from .cool_grammar import G
+from .lr1 import get_parser
+from .pipeline import SemanticPipeline
+from .tables import TABLE_FILE
+from .tokenizer import tokenize_text, LexicalError
+from .tools.ast import ProgramNode
+
+# Extensions of the COOL files looked for in the directories
+EXTENSIONS = ('.cl', '.cool')
+
+_table_file = None
+
+def _init_worker(table_file):
+    # With fork the workers inherit the parser of the parent, otherwise it's
+    # loaded from the table file it wrote
+    global _table_file
+    _table_file = table_file
+    get_parser(G, table_file=table_file)
+
+def parse_file(path, result):
+    # AST of the file, or None with the errors in `result`. The file is
+    # tokenized while it is parsed, without reading it whole, so only the
+    # first invalid token is reported
+    parser = get_parser(G, table_file=_table_file)
+    with open(path, encoding='utf-8') as f:
+        try:
+            return parser(tokenize_text.stream(f, strict=True), evaluate=True)
+        except LexicalError as e:
+            result['lex_errors'] = [ e.text ]
+        except Exception as e:
+            result['parser_errors'] = e.args[0]
+    return None
+
+def _finish(result, start):
+    result['ok'] = not any(result.get(key) for key in ('lex_errors', 'parser_errors', 'errors', 'crash'))
+    result['time'] = time.perf_counter() - start
+    return result
+
+def analyze_file(path):
+    """
+    Tokenizes, parses and checks a COOL file. Returns a dict with the errors
+    of the first phase that failed and the time it took, in seconds.
+    """
+    start = time.perf_counter()
+    result = { 'file': path }
+    try:
+        ast = parse_file(path, result)
+        if ast is not None:
+            _, _, errors = SemanticPipeline().run(ast)
+            result['errors'] = errors
+    except Exception as e:
+        result['crash'] = f'{type(e).__name__}: {e}'
+    return _finish(result, start)
+
+def _parse_only(path):
+    start = time.perf_counter()
+    result = { 'file': path }
+    try:
+        result['ast'] = parse_file(path, result)
+    except Exception as e:
+        result['crash'] = f'{type(e).__name__}: {e}'
+    return _finish(result, start)
+
+def link(programs):
+    """
+    Joins the ASTs of several files into the AST of one program, with their
+    classes in the same order.
+    """
+    return ProgramNode([ declaration for program in programs for declaration in program.declarations ])
+
+def find_files(paths, extensions=EXTENSIONS):
+    # Files given by name are always checked, directories are walked in
+    # sorted order so the output is the same in every run
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            for name in sorted(files):
+                if name.endswith(extensions):
+                    yield os.path.join(root, name)
+
+def percentile(values, p):
+    # Nearest rank percentile of sorted values
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+def run(paths, jobs=None, table_file=TABLE_FILE, chunksize=4, out=sys.stdout, linked=False):
+    """
+    Checks the files in `paths` in parallel, writing the result of each one
+    to `out` as a JSON line, in order. Returns the summary of the run.
+
+    With `linked=True` the files are the parts of a single program: they
+    are parsed in parallel and, if all of them are right, their classes are
+    checked together, with the type checking of the classes spread over the
+    workers. The result of the program is written in one more line.
+    """
+    files = list(find_files(paths))
+    # Built once here, the workers get the tables from the parent or its file
+    get_parser(G, table_file=table_file)
+
+    start = time.perf_counter()
+    times = []
+    failed = 0
+    programs = []
+    task = _parse_only if linked else analyze_file
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(table_file,)) as executor:
+        for result in executor.map(task, files, chunksize=chunksize):
+            programs.append(result.pop('ast', None))
+            out.write(json.dumps(result) + '\n')
+            times.append(result['time'])
+            failed += not result['ok']
+
+    if linked and not failed:
+        program_start = time.perf_counter()
+        result = { 'program': files }
+        try:
+            ast = link(programs)
+            _, _, result['errors'] = SemanticPipeline(jobs=jobs or os.cpu_count()).run(ast)
+        except Exception as e:
+            result['crash'] = f'{type(e).__name__}: {e}'
+        _finish(result, program_start)
+        out.write(json.dumps(result) + '\n')
+        failed += not result['ok']
+    elapsed = time.perf_counter() - start
+
+    times.sort()
+    return {
+        'files': len(files),
+        'failed': failed,
+        'seconds': elapsed,
+        'files_per_sec': len(files) / elapsed if elapsed else 0.0,
+        'p50': percentile(times, 50),
+        'p99': percentile(times, 99),
+    }
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Type-check COOL files in parallel, writing one JSON line per file.')
+    arg_parser.add_argument('paths', nargs='+', help='COOL files or directories with them')
+    arg_parser.add_argument('-j', '--jobs', type=int, default=None, help='number of worker processes (default: one per CPU)')
+    arg_parser.add_argument('-t', '--table-file', default=TABLE_FILE, help='file with the cached parsing tables')
+    arg_parser.add_argument('-c', '--chunksize', type=int, default=4, help='files sent to a worker at once')
+    arg_parser.add_argument('-l', '--link', action='store_true', help='check the files as the parts of one program')
+    args = arg_parser.parse_args(argv)
+
+    summary = run(args.paths, args.jobs, args.table_file, args.chunksize, linked=args.link)
+    print(f"{summary['files']} files, {summary['failed']} with errors in {summary['seconds']:.2f}s: "
+          f"{summary['files_per_sec']:.1f} files/sec, p50 {summary['p50'] * 1000:.1f}ms, p99 {summary['p99'] * 1000:.1f}ms",
+          file=sys.stderr)
+    return 1 if summary['failed'] else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
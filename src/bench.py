@@ -0,0 +1,204 @@
+import argparse
+import gc
+import json
+import random
+import sys
+import time
+
+from .cool_grammar import G
+from .evaluations import evaluate_reverse_parse
+from .lr1 import LR1Parser, get_parser
+from .pipeline import SemanticPipeline
+from .tables import TABLE_FILE
+from .tokenizer import tokenize_text
+
+# Stages under this time, in seconds, are too noisy to report a regression
+MIN_REGRESSION = 0.001
+
+
+class ProgramGenerator:
+    """
+    Generates synthetic COOL programs, the same one for the same parameters.
+
+    The classes form inheritance chains of `depth` classes. Every class has
+    an attribute and `methods` methods, whose bodies are expressions nested
+    `nesting` levels deep that call the methods defined before them in the
+    class and its ancestors. Each declared type is `AUTO_TYPE` with
+    probability `auto`, otherwise `Int`.
+    """
+
+    def __init__(self, classes=50, depth=4, methods=4, nesting=3, auto=0.2, seed=0):
+        self.classes = classes
+        self.depth = depth
+        self.methods = methods
+        self.nesting = nesting
+        self.auto = auto
+        self.seed = seed
+
+    @property
+    def config(self):
+        return { 'classes': self.classes, 'depth': self.depth, 'methods': self.methods,
+                 'nesting': self.nesting, 'auto': self.auto, 'seed': self.seed }
+
+    def generate(self):
+        self.random = random.Random(self.seed)
+        self.variables = 0
+        parts = []
+        visible = []
+        for i in range(self.classes):
+            if i % self.depth == 0:
+                visible = []
+                header = f'class C{i} {{'
+            else:
+                header = f'class C{i} inherits C{i - 1} {{'
+            lines = [ header, f'    a{i} : {self._type()} <- {self._expr(0, [ "1" ], [])} ;' ]
+            names = [ 'p', 'q', f'a{i}' ] + [ f'a{j}' for j in range(i - i % self.depth, i) ]
+            for k in range(self.methods):
+                method = f'm{i}_{k}'
+                body = self._expr(self.nesting, names, visible)
+                lines.append(f'    {method} ( p : {self._type()} , q : Int ) : {self._type()} {{ {body} }} ;')
+                visible.append(method)
+            lines.append('} ;')
+            parts.append('\n'.join(lines))
+        return '\n'.join(parts) + '\n'
+
+    def _type(self):
+        return 'AUTO_TYPE' if self.random.random() < self.auto else 'Int'
+
+    def _operand(self, expr):
+        # Compound operands are enclosed in parentheses
+        return expr if ' ' not in expr else f'( {expr} )'
+
+    def _expr(self, level, names, methods):
+        # An expression of type Int
+        choice = self.random.randrange(6) if level > 0 else -1
+        sub = lambda: self._expr(level - 1, names, methods)
+        operand = lambda: self._operand(sub())
+        if choice == 0:
+            return f'{operand()} + {operand()}'
+        if choice == 1:
+            return f'{operand()} * {operand()}'
+        if choice == 2:
+            return f'if {operand()} < {operand()} then {sub()} else {sub()} fi'
+        if choice == 3:
+            self.variables += 1
+            var = f'v{self.variables}'
+            body = self._expr(level - 1, names + [ var ], methods)
+            return f'let {var} : {self._type()} <- {sub()} in {body}'
+        if choice == 4:
+            return f'{{ {sub()} ; {sub()} ; }}'
+        if choice == 5 and methods:
+            return f'self . {self.random.choice(methods)} ( {sub()} , {sub()} )'
+        return self.random.choice(names + [ str(self.random.randrange(100)) ])
+
+
+def time_stages(text, repeat=5, build=True):
+    """
+    Times every stage of the analysis of `text`. Returns the best time of
+    `repeat` runs of each one, in seconds. The construction of the parser
+    is timed once, only if `build` is set.
+    """
+    stages = {}
+    if build:
+        start = time.perf_counter()
+        LR1Parser(G)
+        stages['parser_build'] = time.perf_counter() - start
+    parser = get_parser(G, table_file=TABLE_FILE)
+
+    best = {}
+    def record(name, elapsed):
+        best[name] = min(best.get(name, elapsed), elapsed)
+
+    for _ in range(repeat):
+        # Like timeit, the collector doesn't run while the stages are timed
+        gc.collect()
+        gc.disable()
+        try:
+            _run_stages(text, parser, record)
+        finally:
+            gc.enable()
+
+    stages.update(best)
+    return stages
+
+
+def _run_stages(text, parser, record):
+    start = time.perf_counter()
+    tokens = tokenize_text(text)
+    record('tokenize', time.perf_counter() - start)
+
+    start = time.perf_counter()
+    parse, operations = parser(tokens)
+    record('parse', time.perf_counter() - start)
+
+    start = time.perf_counter()
+    ast = evaluate_reverse_parse(parse, operations, tokens)
+    record('evaluate', time.perf_counter() - start)
+
+    pipeline = SemanticPipeline()
+    pipeline.run(ast)
+    for name, stats in pipeline.stats.items():
+        record(name, stats.time)
+
+
+def compare(stages, baseline, threshold):
+    # Stages of `baseline` that got slower than the threshold allows
+    regressions = []
+    for name, old in baseline.items():
+        new = stages.get(name)
+        if new is not None and new > old * (1 + threshold) and new - old > MIN_REGRESSION:
+            regressions.append((name, old, new))
+    return regressions
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Benchmark every stage of the analysis of a synthetic COOL program.')
+    arg_parser.add_argument('--classes', type=int, default=50, help='number of classes')
+    arg_parser.add_argument('--depth', type=int, default=4, help='length of the inheritance chains')
+    arg_parser.add_argument('--methods', type=int, default=4, help='methods per class')
+    arg_parser.add_argument('--nesting', type=int, default=3, help='nesting of the method bodies')
+    arg_parser.add_argument('--auto', type=float, default=0.2, help='fraction of the types declared as AUTO_TYPE')
+    arg_parser.add_argument('--seed', type=int, default=0, help='seed of the generator')
+    arg_parser.add_argument('-r', '--repeat', type=int, default=5, help='runs of each stage, the best one is kept')
+    arg_parser.add_argument('--no-build', action='store_true', help="don't time the construction of the parser")
+    arg_parser.add_argument('-s', '--save', help='write the results to this JSON file, as a baseline')
+    arg_parser.add_argument('-b', '--baseline', help='JSON file with the results to compare with')
+    arg_parser.add_argument('-t', '--threshold', type=float, default=0.25, help='allowed slowdown of a stage, 0.25 is 25%%')
+    arg_parser.add_argument('-p', '--print-program', action='store_true', help='print the generated program and exit')
+    args = arg_parser.parse_args(argv)
+
+    generator = ProgramGenerator(args.classes, args.depth, args.methods, args.nesting, args.auto, args.seed)
+    text = generator.generate()
+    if args.print_program:
+        print(text)
+        return 0
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['config'] != generator.config:
+            print(f'The baseline was run with {baseline["config"]}', file=sys.stderr)
+            return 2
+
+    stages = time_stages(text, args.repeat, not args.no_build)
+    for name, elapsed in stages.items():
+        line = f'{name:>12}: {elapsed * 1000:9.2f}ms'
+        if baseline and name in baseline['stages']:
+            line += f'  ({elapsed / baseline["stages"][name] - 1:+.0%})' if baseline['stages'][name] else ''
+        print(line)
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({ 'config': generator.config, 'stages': stages }, f, indent=2)
+
+    if baseline:
+        regressions = compare(stages, baseline['stages'], args.threshold)
+        for name, old, new in regressions:
+            print(f'{name} regressed: {old * 1000:.2f}ms -> {new * 1000:.2f}ms', file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
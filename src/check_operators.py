@@ -0,0 +1,86 @@
+"""
+Checks the associativity and precedence of the COOL operators. Every case
+is an expression and the same expression fully parenthesized, both are
+parsed inside a method and their ASTs must be the same.
+
+    python -m src.check_operators
+"""
+import sys
+
+from .cool_grammar import G
+from .lr1 import get_parser
+from .tokenizer import tokenize_text
+from .tools.ast import Node
+
+CASES = [
+    # all of the binary operators are left associative
+    ('a - b - c', '( a - b ) - c'),
+    ('a / b / c', '( a / b ) / c'),
+    ('a <= b <= c', '( a <= b ) <= c'),
+    ('a = b = c', '( a = b ) = c'),
+    ('a - b + c', '( a - b ) + c'),
+    ('a / b * c', '( a / b ) * c'),
+    ('a <= b = c', '( a <= b ) = c'),
+    # products bind tighter than sums and sums than comparisons
+    ('a - b / c', 'a - ( b / c )'),
+    ('a / b - c', '( a / b ) - c'),
+    ('a - b <= c / d', '( a - b ) <= ( c / d )'),
+    ('a = b - c / d', 'a = ( b - ( c / d ) )'),
+    ('a - b / c <= d = e', '( ( a - ( b / c ) ) <= d ) = e'),
+    # not takes the whole comparison
+    ('not a <= b', 'not ( a <= b )'),
+    ('not a = b - c', 'not ( a = ( b - c ) )'),
+    ('not a / b <= c = d', 'not ( ( ( a / b ) <= c ) = d )'),
+    # ~ and isvoid only take their operand
+    ('~ a - b', '( ~ a ) - b'),
+    ('a / ~ b', 'a / ( ~ b )'),
+    ('isvoid a - b', '( isvoid a ) - b'),
+    ('isvoid a <= b', '( isvoid a ) <= b'),
+    ('isvoid ~ a = b', '( isvoid ( ~ a ) ) = b'),
+    ('a = isvoid b / c', 'a = ( ( isvoid b ) / c )'),
+    ('not isvoid a = ~ b - c', 'not ( ( isvoid a ) = ( ( ~ b ) - c ) )'),
+    ('~ a / ~ b <= isvoid c', '( ( ~ a ) / ( ~ b ) ) <= ( isvoid c )'),
+]
+
+PROGRAM = 'class A { f ( ) : Int { %s } ; } ;'
+
+
+def parse_expr(parser, text):
+    # AST of `text` as the body of a method
+    program = parser(tokenize_text(PROGRAM % text), evaluate=True)
+    return program.declarations[0].features[0].body
+
+def same_tree(left, right):
+    if type(left) is not type(right):
+        return False
+    if isinstance(left, Node):
+        return vars(left).keys() == vars(right).keys() and \
+            all(same_tree(value, vars(right)[key]) for key, value in vars(left).items())
+    if isinstance(left, (list, tuple)):
+        return len(left) == len(right) and all(same_tree(x, y) for x, y in zip(left, right))
+    return left == right
+
+def show(node):
+    # The expression with every operation between parentheses
+    if isinstance(node, Node) and hasattr(node, 'left'):
+        return f'({show(node.left)} {type(node).__name__} {show(node.right)})'
+    if isinstance(node, Node) and hasattr(node, 'expr'):
+        return f'({type(node).__name__} {show(node.expr)})'
+    if isinstance(node, Node) and hasattr(node, 'lex'):
+        return str(node.lex)
+    return repr(node)
+
+def main():
+    parser = get_parser(G)
+    failed = 0
+    for text, expected in CASES:
+        tree, expected_tree = parse_expr(parser, text), parse_expr(parser, expected)
+        if not same_tree(tree, expected_tree):
+            failed += 1
+            print(f'FAIL {text}\n\tgot      {show(tree)}\n\texpected {show(expected_tree)}')
+    print(f'{len(CASES) - failed}/{len(CASES)} operator expressions parsed as expected')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
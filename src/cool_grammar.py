@@ -1,4 +1,4 @@
-from .tools.grammar import Grammar
+from .tools.grammar import Grammar, pass_through
 from .tools.ast import *
 
 # grammar
@@ -9,9 +9,9 @@ program = G.NonTerminal('<program>', startSymbol=True)
 class_list, def_class = G.NonTerminals('<class-list> <def-class>')
 feature_list, def_attr, def_func = G.NonTerminals('<feature-list> <def-attr> <def-func>')
 param_list, param, expr_list = G.NonTerminals('<param-list> <param> <expr-list>')
-expr, arith, term, factor, atom = G.NonTerminals('<expr> <arith> <term> <factor> <atom>')
+expr, arith, factor, atom = G.NonTerminals('<expr> <arith> <factor> <atom>')
 func_call, arg_list, case, block = G.NonTerminals('<func-call> <arg-list> <case> <block>')
-let_assign, let_list, cases_list, op, comp = G.NonTerminals('<let-assign> <let-list> <cases-list> <op> <comp>')
+let_assign, let_list, cases_list, comp = G.NonTerminals('<let-assign> <let-list> <cases-list> <comp>')
 void, bin_no, base_call = G.NonTerminals('<void> <bin-no> <base-call>')
 # log_no, dot_call, call = G.NonTerminals('<log-no> <dot-call> <call>')
 
@@ -58,7 +58,7 @@ expr %= let + let_list + inx + expr, lambda h,s: LetNode(s[2], s[4])
 expr %= casex + expr + of + cases_list + esac, lambda h,s: CaseNode(s[2], s[4])
 expr %= ifx + expr + then + expr + elsex + expr + fi, lambda h,s: ConditionalNode(s[2], s[4], s[6])
 expr %= whilex + expr + loop + expr + pool, lambda h,s: WhileNode(s[2], s[4])
-expr %= arith, lambda h,s: s[1]
+expr %= arith, pass_through
 
 let_list %= let_assign, lambda h,s: [s[1]]
 let_list %= let_assign + comma + let_list, lambda h,s: [s[1]] + s[3]
@@ -75,33 +75,35 @@ case %= idx + colon + idx + rarrow + expr, lambda h,s: OptionNode(s[1], s[3], s[
 arith %= idx + larrow + expr, lambda h,s: AssignNode(s[1], s[3])
 # arith %= log_no, lambda h,s: s[1]
 arith %= notx + comp, lambda h,s: NotNode(s[2])
-arith %= comp, lambda h,s: s[1] 
+arith %= comp, pass_through
 
 # log_no %= notx + comp, lambda h,s: NotNode(s[2])
 # log_no %= comp, lambda h,s: s[1]
 
-comp %= comp + less + op, lambda h,s: LessNode(s[1], s[3])
-comp %= comp + lesseq + op, lambda h,s: LessEqNode(s[1], s[3])
-comp %= comp + equal + op, lambda h,s: EqualNode(s[1], s[3])
-comp %= op, lambda h,s: s[1]
-
-op %= op + plus + term, lambda h,s: PlusNode(s[1], s[3])
-op %= op + minus + term, lambda h,s: MinusNode(s[1], s[3])
-op %= term, lambda h,s: s[1]
-
-# <term>         ???
-term %= term + star + void, lambda h,s: StarNode(s[1], s[3])
-term %= term + div + void, lambda h,s: DivNode(s[1], s[3])
-term %= void, lambda h,s: s[1]
+# The binary operators are in a single level, their precedences tell
+# them apart: comparisons bind looser than sums and sums than products,
+# all of them to the left
+comp %= comp + less + comp, lambda h,s: LessNode(s[1], s[3])
+comp %= comp + lesseq + comp, lambda h,s: LessEqNode(s[1], s[3])
+comp %= comp + equal + comp, lambda h,s: EqualNode(s[1], s[3])
+comp %= comp + plus + comp, lambda h,s: PlusNode(s[1], s[3])
+comp %= comp + minus + comp, lambda h,s: MinusNode(s[1], s[3])
+comp %= comp + star + comp, lambda h,s: StarNode(s[1], s[3])
+comp %= comp + div + comp, lambda h,s: DivNode(s[1], s[3])
+comp %= void, pass_through
+
+G.Precedence('left', less, lesseq, equal)
+G.Precedence('left', plus, minus)
+G.Precedence('left', star, div)
 
 void %= isvoid + bin_no, lambda h,s: IsVoidNode(s[2])
-void %= bin_no, lambda h,s: s[1]
+void %= bin_no, pass_through
 
 bin_no %= nox + base_call, lambda h,s: BinaryNotNode(s[2])
-bin_no %= base_call, lambda h,s: s[1]
+bin_no %= base_call, pass_through
 
 base_call %= factor + arroba + idx + dot + func_call, lambda h,s: BaseCallNode(s[1], s[3], *s[5])
-base_call %= factor, lambda h,s: s[1]
+base_call %= factor, pass_through
 
 # dot_call %= call + dot + func_call, lambda h,s: CallNode(s[1], *s[3])
 # dot_call %= call, lambda h,s: s[1]
@@ -110,7 +112,7 @@ base_call %= factor, lambda h,s: s[1]
 # call %= factor, lambda h,s: s[1]
 
 # <factor>       ???
-factor %= atom, lambda h,s: s[1]
+factor %= atom, pass_through
 factor %= opar + expr + cpar, lambda h,s: s[2]
 factor %= factor + dot + func_call, lambda h,s: CallNode(s[1], *s[3])
 factor %= func_call, lambda h,s: StaticCallNode(*s[1])
@@ -19,6 +19,9 @@ def evaluate_reverse_parse(right_parse, operations, tokens):
             assert all(rule is None for rule in attributes[1:]), 'There must be only synteticed attributes.'
             rule = attributes[0]
 
+            if production.IsPassThrough:
+                # The value of the body is already on top of the stack
+                continue
             if len(body):
                 synteticed = [None] + stack[-len(body):]
                 value = rule(None, synteticed)
@@ -0,0 +1,200 @@
+import hashlib
+import threading
+
+from src.cool_grammar import G, classx, ocur, ccur, semi, idx
+from src.lr1 import get_parser
+from src.pipeline import SemanticPipeline
+from src.tokenizer import Token
+from src.tools.ast import ProgramNode, FuncDeclarationNode
+
+
+class ClassSpan:
+    """
+    Tokens of a class declaration, with its AST and the names it defines
+    (the class and its methods) and the ones it uses (every identifier).
+    """
+    __slots__ = ('key', 'node', 'defines', 'uses')
+
+    def __init__(self, key, node, uses):
+        self.key = key
+        self.node = node
+        self.defines = { node.id } | { feat.id for feat in node.features if isinstance(feat, FuncDeclarationNode) }
+        self.uses = uses
+
+
+def split_classes(tokens):
+    """
+    Splits the tokens of a program into the tokens of every class, or returns
+    None if they don't look like a list of class declarations.
+    """
+    spans = []
+    start = 0
+    depth = 0
+    closed = False
+    for i, token in enumerate(tokens):
+        token_type = token.token_type
+        if token_type == G.EOF:
+            break
+        if i == start and token_type != classx:
+            return None
+        if token_type == ocur:
+            depth += 1
+        elif token_type == ccur:
+            depth -= 1
+            if depth < 0:
+                return None
+            closed = depth == 0
+        elif token_type == semi and depth == 0 and closed:
+            spans.append(tokens[start:i + 1])
+            start = i + 1
+            closed = False
+    # Nothing but the end of the input may follow the last class
+    if not spans or start >= len(tokens) or tokens[start].token_type != G.EOF:
+        return None
+    return spans
+
+
+def span_key(tokens):
+    text = '\0'.join(f'{token.token_type}\1{token.lex}' for token in tokens)
+    return hashlib.sha1(text.encode()).hexdigest()
+
+
+class IncrementalAnalyzer:
+    """
+    Analyzes successive versions of a program, reusing the work done on the
+    classes that didn't change.
+
+    The AST of every class is cached by the hash of its tokens. The semantic
+    analysis is only run again on the classes connected to a changed one:
+    two classes are connected when one uses a name the other defines (its
+    name or the name of one of its methods), before or after the change.
+    The types, scopes and errors of the other classes are kept from the
+    last run. If the classes of the program aren't the same ones, in the
+    same order, everything is analyzed again.
+    """
+
+    def __init__(self, table_file=None):
+        self.table_file = table_file
+        self.pipeline = SemanticPipeline()
+        self.lock = threading.Lock()
+        self.spans = {}         # key -> ClassSpan of the last version
+        self.parsed = None      # (ast, spans) of the last parse
+        self.analyzed = None    # (ast, spans) of the last analysis
+        self.result = None
+        self.reanalyzed = 0     # classes analyzed again in the last check
+
+    def parse(self, tokens):
+        """
+        Builds the AST of the program, parsing only the classes not seen in
+        the last version. Raises the same errors as the parser.
+        """
+        parser = get_parser(G, table_file=self.table_file)
+        with self.lock:
+            token_spans = split_classes(tokens)
+            if token_spans is None:
+                self.parsed = None
+                return parser(tokens, evaluate=True)
+
+            spans = []
+            cache = {}
+            eof = Token('$', G.EOF)
+            for span_tokens in token_spans:
+                key = span_key(span_tokens)
+                span = self.spans.get(key) or cache.get(key)
+                if span is None:
+                    try:
+                        program = parser(span_tokens + [ eof ], evaluate=True)
+                    except Exception:
+                        # Reported as the parser would do with the whole text
+                        self.parsed = None
+                        return parser(tokens, evaluate=True)
+                    uses = { token.lex for token in span_tokens if token.token_type == idx }
+                    span = ClassSpan(key, program.declarations[0], uses)
+                cache[key] = span
+                spans.append(span)
+
+            self.spans = cache
+            ast = ProgramNode([ span.node for span in spans ])
+            self.parsed = (ast, spans)
+            return ast
+
+    def check(self, ast):
+        """
+        Runs the semantic analysis of the AST returned by the last `parse`.
+        Returns the context, the scope and the errors, like
+        `SemanticPipeline.run`.
+        """
+        with self.lock:
+            if self.parsed is None or self.parsed[0] is not ast:
+                self.analyzed = None
+                self.reanalyzed = len(ast.declarations)
+                return self.pipeline.run(ast)
+
+            spans = self.parsed[1]
+            dirty = self._dirty(spans)
+            # If an analysis fails its results can't be reused
+            self.analyzed = None
+            if dirty is None:
+                self.reanalyzed = len(spans)
+                self.result = self.pipeline.run(ast)
+            else:
+                self.reanalyzed = len(dirty)
+                if dirty:
+                    self.result = self._rerun(ast, spans, dirty)
+            self.analyzed = (ast, spans)
+            return self.result
+
+    def _dirty(self, spans):
+        # Indices of the classes to analyze again, None to analyze everything
+        if self.analyzed is None:
+            return None
+        old_spans = self.analyzed[1]
+        names = [ span.node.id for span in spans ]
+        if names != [ span.node.id for span in old_spans ] or len(set(names)) != len(names):
+            return None
+
+        changed = [ i for i, (new, old) in enumerate(zip(spans, old_spans)) if new.key != old.key ]
+        if not changed:
+            return []
+
+        # The old uses and definitions of the changed classes still count:
+        # the last analysis of those classes could have changed the others
+        defines = [ set(span.defines) for span in spans ]
+        uses = [ set(span.uses) for span in spans ]
+        for i in changed:
+            defines[i] |= old_spans[i].defines
+            uses[i] |= old_spans[i].uses
+
+        definers = {}
+        users = {}
+        for i in range(len(spans)):
+            for name in defines[i]:
+                definers.setdefault(name, []).append(i)
+            for name in uses[i]:
+                users.setdefault(name, []).append(i)
+
+        dirty = set(changed)
+        pending = list(changed)
+        while pending:
+            i = pending.pop()
+            neighbours = [ j for name in uses[i] for j in definers.get(name, ()) ]
+            neighbours += [ j for name in defines[i] for j in users.get(name, ()) ]
+            for j in neighbours:
+                if j not in dirty:
+                    dirty.add(j)
+                    pending.append(j)
+        return sorted(dirty)
+
+    def _rerun(self, ast, spans, dirty):
+        # The context and scope of the last result may still be in use, the
+        # classes analyzed again go to copies of them
+        context = self.pipeline.context = self.pipeline.context.copy()
+        self.pipeline.scope = self.pipeline.scope.copy()
+        order = list(context.types)
+        for i in dirty:
+            del context.types[spans[i].node.id]
+
+        result = self.pipeline.rerun(ast, dirty)
+        # Keep the types in the order of a full analysis
+        context.types = { name: context.types[name] for name in order }
+        return result
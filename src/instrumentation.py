@@ -0,0 +1,290 @@
+"""
+Opt-in counters and timers of the hot paths of the analysis.
+
+Nothing is measured until `enable` is called: it replaces the instrumented
+functions with versions that also record what they do, and `disable` puts
+the originals back, so a disabled instrumentation costs nothing but a
+`None` check per action of the parser.
+
+The calls are recorded in the `Metrics` of the current thread, only while
+it is inside a `collect()` block. When the block ends its metrics are also
+added to the totals of the process, reported by `prometheus()`.
+"""
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from .lr1 import ShiftReduceParser
+from .tools import utils
+from .tools.semantic import Scope, Type
+from .visitor.visitor import Dispatcher
+
+
+class Metrics:
+    """
+    Counts and times of one or more analyses.
+
+    `reductions[i]` and `reduction_time[i]` are the reductions made by the
+    `i`-th production and the time spent in its semantic rule. The depth of
+    a variable lookup is the number of scopes visited to resolve it.
+    """
+
+    def __init__(self):
+        self.analyses = 0
+        self.timers = Counter()
+        self.shifts = 0
+        self.productions = []
+        self.reductions = []
+        self.reduction_time = []
+        self.visits = Counter()
+        self.lookup_depths = Counter()
+        self.conforms_to = 0
+        self.common_basetype = 0
+        self.common_basetype_time = 0.0
+        self._lookup_level = 0
+        self._lookup_reach = 0
+
+    def parsing(self, productions):
+        # Called by the parser before a parse, returns the counters of the
+        # reductions. Only the productions of one grammar are recorded
+        if not self.productions:
+            self.productions = productions
+            self.reductions = [ 0 ] * len(productions)
+            self.reduction_time = [ 0.0 ] * len(productions)
+        if self.productions is not productions:
+            return [ 0 ] * len(productions)
+        return self.reductions
+
+    def timed_rules(self, rules, productions):
+        # Semantic rules that add the time they take to their production
+        clock = time.perf_counter
+        times = self.reduction_time if productions is self.productions else [ 0.0 ] * len(rules)
+        def timed(index, rule):
+            def call(h, s):
+                start = clock()
+                try:
+                    return rule(h, s)
+                finally:
+                    times[index] += clock() - start
+            return call
+        return [ timed(i, rule) for i, rule in enumerate(rules) ]
+
+    @contextmanager
+    def timer(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timers[name] += time.perf_counter() - start
+
+    def merge(self, other):
+        self.analyses += other.analyses
+        self.timers.update(other.timers)
+        self.shifts += other.shifts
+        if other.productions and self.parsing(other.productions) is self.reductions:
+            self.reductions = [ a + b for a, b in zip(self.reductions, other.reductions) ]
+            self.reduction_time = [ a + b for a, b in zip(self.reduction_time, other.reduction_time) ]
+        self.visits.update(other.visits)
+        self.lookup_depths.update(other.lookup_depths)
+        self.conforms_to += other.conforms_to
+        self.common_basetype += other.common_basetype
+        self.common_basetype_time += other.common_basetype_time
+
+    def report(self):
+        """
+        The metrics as a dict, with the productions and node types by name.
+        Only the productions used are included.
+        """
+        lookups = sum(self.lookup_depths.values())
+        return {
+            'analyses': self.analyses,
+            'timers': dict(self.timers),
+            'parser': {
+                'shifts': self.shifts,
+                'reductions': sum(self.reductions),
+                'productions': { repr(self.productions[i]): { 'reductions': count, 'time': self.reduction_time[i] }
+                                 for i, count in enumerate(self.reductions) if count },
+            },
+            'visits': dict(self.visits.most_common()),
+            'variable_lookups': {
+                'count': lookups,
+                'mean_depth': sum(depth * n for depth, n in self.lookup_depths.items()) / lookups if lookups else 0.0,
+                'depths': dict(sorted(self.lookup_depths.items())),
+            },
+            'conforms_to': self.conforms_to,
+            'common_basetype': { 'count': self.common_basetype, 'time': self.common_basetype_time },
+        }
+
+
+_state = threading.local()
+_totals = Metrics()
+_totals_lock = threading.Lock()
+_originals = {}
+
+def current():
+    # Metrics of the current thread, or None if it isn't collecting
+    return getattr(_state, 'metrics', None)
+
+@contextmanager
+def collect():
+    """
+    Records the instrumented calls of this thread in a new `Metrics`, that
+    is added to the totals when the block ends. A nested block is added to
+    the metrics of the outer one instead.
+    """
+    metrics = Metrics()
+    metrics.analyses = 1
+    outer = current()
+    _state.metrics = metrics
+    try:
+        yield metrics
+    finally:
+        _state.metrics = outer
+        if outer is not None:
+            outer.merge(metrics)
+        else:
+            with _totals_lock:
+                _totals.merge(metrics)
+
+@contextmanager
+def timer(name):
+    # Times the block in the current metrics, if any
+    metrics = current()
+    if metrics is None:
+        yield
+    else:
+        with metrics.timer(name):
+            yield
+
+
+def _dispatch(original):
+    def __call__(self, *args, **kw):
+        metrics = current()
+        if metrics is not None:
+            metrics.visits[args[self.param_index].__class__.__name__] += 1
+        return original(self, *args, **kw)
+    return __call__
+
+def _find_variable(original):
+    # Lookups that miss in a scope call the lookup of its parent, the deepest
+    # level reached is the number of scopes visited
+    def find_variable(self, vname, index=None):
+        metrics = current()
+        if metrics is None:
+            return original(self, vname, index)
+        metrics._lookup_level += 1
+        metrics._lookup_reach = max(metrics._lookup_reach, metrics._lookup_level)
+        try:
+            return original(self, vname, index)
+        finally:
+            metrics._lookup_level -= 1
+            if metrics._lookup_level == 0:
+                metrics.lookup_depths[metrics._lookup_reach] += 1
+                metrics._lookup_reach = 0
+    return find_variable
+
+def _conforms_to(original):
+    def conforms_to(self, other):
+        metrics = current()
+        if metrics is not None:
+            metrics.conforms_to += 1
+        return original(self, other)
+    return conforms_to
+
+def _get_common_basetype(original):
+    def get_common_basetype(types):
+        metrics = current()
+        if metrics is None:
+            return original(types)
+        start = time.perf_counter()
+        try:
+            return original(types)
+        finally:
+            metrics.common_basetype += 1
+            metrics.common_basetype_time += time.perf_counter() - start
+    return get_common_basetype
+
+def _subclasses(cls):
+    yield cls
+    for sub in cls.__subclasses__():
+        yield from _subclasses(sub)
+
+def _targets():
+    # (owner, name, wrapper factory) of every instrumented function
+    yield Dispatcher, '__call__', _dispatch
+    yield Scope, 'find_variable', _find_variable
+    for cls in _subclasses(Type):
+        if 'conforms_to' in cls.__dict__:
+            yield cls, 'conforms_to', _conforms_to
+    # Modules that imported the function have their own reference to it
+    original = _originals.get((utils, 'get_common_basetype'), utils.get_common_basetype)
+    for module in list(sys.modules.values()):
+        if getattr(module, 'get_common_basetype', None) is original:
+            yield module, 'get_common_basetype', _get_common_basetype
+
+def enable():
+    if enabled():
+        return
+    for owner, name, wrap in list(_targets()):
+        original = owner.__dict__[name]
+        _originals[owner, name] = original
+        setattr(owner, name, wrap(original))
+    ShiftReduceParser.observer = staticmethod(current)
+
+def disable():
+    ShiftReduceParser.observer = None
+    for (owner, name), original in _originals.items():
+        setattr(owner, name, original)
+    _originals.clear()
+
+def enabled():
+    return bool(_originals)
+
+def totals():
+    with _totals_lock:
+        metrics = Metrics()
+        metrics.merge(_totals)
+        return metrics
+
+def reset():
+    global _totals
+    with _totals_lock:
+        _totals = Metrics()
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def prometheus(metrics=None):
+    """
+    The totals, or the given metrics, in the Prometheus text format.
+    """
+    metrics = metrics or totals()
+    lines = []
+    def metric(name, kind, help, samples):
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            labels = ','.join(f'{key}="{_label(v)}"' for key, v in labels.items())
+            lines.append(f'{name}{{{labels}}} {value}' if labels else f'{name} {value}')
+
+    metric('cool_analyses_total', 'counter', 'Analyses recorded.', [ ({}, metrics.analyses) ])
+    metric('cool_stage_seconds_total', 'counter', 'Time spent in each stage of the analysis.',
+           [ ({ 'stage': name }, value) for name, value in sorted(metrics.timers.items()) ])
+    metric('cool_parser_shifts_total', 'counter', 'Tokens shifted by the parser.', [ ({}, metrics.shifts) ])
+    used = [ i for i, count in enumerate(metrics.reductions) if count ]
+    metric('cool_parser_reductions_total', 'counter', 'Reductions made by each production.',
+           [ ({ 'production': repr(metrics.productions[i]) }, metrics.reductions[i]) for i in used ])
+    metric('cool_parser_reduction_seconds_total', 'counter', 'Time spent in the semantic rule of each production.',
+           [ ({ 'production': repr(metrics.productions[i]) }, metrics.reduction_time[i]) for i in used ])
+    metric('cool_visits_total', 'counter', 'Visitor calls by node type.',
+           [ ({ 'node': name }, count) for name, count in sorted(metrics.visits.items()) ])
+    metric('cool_variable_lookups_total', 'counter', 'Variable lookups by the number of scopes visited.',
+           [ ({ 'depth': depth }, count) for depth, count in sorted(metrics.lookup_depths.items()) ])
+    metric('cool_conforms_to_total', 'counter', 'Calls to Type.conforms_to.', [ ({}, metrics.conforms_to) ])
+    metric('cool_common_basetype_total', 'counter', 'Calls to get_common_basetype.', [ ({}, metrics.common_basetype) ])
+    metric('cool_common_basetype_seconds_total', 'counter', 'Time spent in get_common_basetype.',
+           [ ({}, metrics.common_basetype_time) ])
+    return '\n'.join(lines) + '\n'
@@ -1,76 +1,285 @@
-from .tools.utils import ContainerSet, compute_firsts, compute_local_first
-from .tools.grammar import Item
+import json
+import os
+import threading
+from array import array
+
+from .tools.utils import compute_firsts, compute_local_first
+from .tools.grammar import Item, AttributeProduction
 from .tools.automata import State, multiline_formatter
 
 class ShiftReduceParser:
     SHIFT = 'SHIFT'
     REDUCE = 'REDUCE'
     OK = 'OK'
+    # Bump whenever the layout written by `save_tables` changes
+    TABLES_VERSION = 2
+
+    # Encoding of the compiled action table: the low bits hold the kind of
+    # action and the rest the target state or the production index
+    ERROR_CODE, SHIFT_CODE, REDUCE_CODE, OK_CODE = range(4)
+    CODE_BITS = 2
+    CODE_MASK = (1 << CODE_BITS) - 1
+    # Returns the metrics where the parses are recorded, or None. Set by
+    # `src.instrumentation` when it's enabled
+    observer = None
     
-    def __init__(self, G, verbose=False):
+    def __init__(self, G, verbose=False, table_file=None):
         self.G = G
         self.verbose = verbose
         self.action = {}
         self.goto = {}
-        self._build_parsing_table()
+        self._index_symbols()
+        if table_file is None or not self.load_tables(table_file):
+            self._build_parsing_table()
+            self._compile_tables()
+            if table_file is not None:
+                try:
+                    self.save_tables(table_file)
+                except OSError:
+                    # Not being able to cache the tables is not an error,
+                    # the next process will just build them again
+                    pass
+        self._compile_chains()
     
     def _build_parsing_table(self):
         raise NotImplementedError()
 
-    def __call__(self, w):
+    def _index_symbols(self):
+        G = self.G
+        self.terminals = G.terminals + [ G.EOF ]
+        self.terminal_ids = { t: i for i, t in enumerate(self.terminals) }
+        self.nonterminal_ids = { nt: i for i, nt in enumerate(G.nonTerminals) }
+        self.production_lengths = array('i', (len(prod.Right) for prod in G.Productions))
+        self.production_lefts = array('i', (self.nonterminal_ids[prod.Left] for prod in G.Productions))
+        self.production_rules = None
+        if G.pType is AttributeProduction:
+            assert all(rule is None for prod in G.Productions for rule in prod.attributes[1:]), 'There must be only synteticed attributes.'
+            self.production_rules = [ prod.attributes[0] for prod in G.Productions ]
+
+    def _compile_tables(self):
+        # Turns the `(state, symbol)` dictionaries filled by
+        # `_build_parsing_table` into flat arrays with one row per state
+        states = { state for state, _ in self.action } | { state for state, _ in self.goto }
+        self.states = max(states) + 1
+        n_terminals = len(self.terminals)
+        n_nonterminals = len(self.nonterminal_ids)
+        prod_ids = { prod: i for i, prod in enumerate(self.G.Productions) }
+
+        action = array('i', [self.ERROR_CODE]) * (self.states * n_terminals)
+        for (state, symbol), (act, tag) in self.action.items():
+            if act == self.SHIFT:
+                code = tag << self.CODE_BITS | self.SHIFT_CODE
+            elif act == self.REDUCE:
+                code = prod_ids[tag] << self.CODE_BITS | self.REDUCE_CODE
+            else:
+                code = self.OK_CODE
+            action[state * n_terminals + self.terminal_ids[symbol]] = code
+
+        goto = array('i', [-1]) * (self.states * n_nonterminals)
+        for (state, symbol), target in self.goto.items():
+            goto[state * n_nonterminals + self.nonterminal_ids[symbol]] = target
+
+        self.action = action
+        self.goto = goto
+
+    def _compile_chains(self):
+        """
+        Collapses the chains of pass-through unit reductions. A reduction to
+        `A` that uncovers the state `s` goes to `goto(s, A)` and, if the
+        lookahead makes it reduce by a pass-through `B -> A`, `s` is uncovered
+        again and the parser goes to `goto(s, B)`, and so on until an action
+        that isn't one of those. The chain only depends on `s`, `A` and the
+        lookahead, so it is followed here once: where it may start, the
+        goto table used by the parser holds `-2 - k` and `chains[k]` holds,
+        for every lookahead, the state where the chain ends and the unit
+        productions reduced on the way.
+        """
+        n_terminals = len(self.terminals)
+        n_nonterminals = len(self.nonterminal_ids)
+        action, goto, lefts = self.action, self.goto, self.production_lefts
+        code_bits, code_mask, REDUCE = self.CODE_BITS, self.CODE_MASK, self.REDUCE_CODE
+        units = { i for i, prod in enumerate(self.G.Productions) if prod.IsPassThrough }
+
+        # States that reduce by a pass-through production on some lookahead
+        reducing = set()
+        for index, code in enumerate(action):
+            if code & code_mask == REDUCE and code >> code_bits in units:
+                reducing.add(index // n_terminals)
+
+        def follow(state, target, row):
+            chain = []
+            while True:
+                code = action[target * n_terminals + row]
+                prod = code >> code_bits
+                if code & code_mask != REDUCE or prod not in units:
+                    return target, tuple(chain)
+                chain.append(prod)
+                target = goto[state * n_nonterminals + lefts[prod]]
+
+        self.chains = []
+        rows = {}
+        self.chained_goto = array('i', goto)
+        for index, target in enumerate(goto):
+            if target in reducing:
+                state = index // n_nonterminals
+                chains = tuple(follow(state, target, row) for row in range(n_terminals))
+                try:
+                    k = rows[chains]
+                except KeyError:
+                    k = rows[chains] = len(self.chains)
+                    self.chains.append(chains)
+                self.chained_goto[index] = -2 - k
+
+    def _tables_header(self):
+        return {
+            'version': self.TABLES_VERSION,
+            'parser': type(self).__name__,
+            'grammar': self.G.fingerprint,
+        }
+
+    def save_tables(self, fname):
+        # The compiled tables only hold state numbers, production indices in
+        # `G.Productions` and symbol ids given by the grammar order, so the
+        # file doesn't depend on the attribute rules.
+        data = self._tables_header()
+        data.update(states=self.states, action=self.action.tolist(), goto=self.goto.tolist())
+
+        directory = os.path.dirname(fname)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write to a temporary file first, so concurrent workers never read
+        # a half written table.
+        tmp = f'{fname}.{os.getpid()}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp, fname)
+
+    def load_tables(self, fname):
+        try:
+            with open(fname) as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return False
+
+        header = self._tables_header()
+        if any(data.get(key) != value for key, value in header.items()):
+            return False
+
+        self.states = data['states']
+        self.action = array('i', data['action'])
+        self.goto = array('i', data['goto'])
+        return True
+
+    def __call__(self, w, evaluate=False, get_parse=False):
+        """
+        Parses the tokens in `w`, any iterable of tokens ending with the EOF
+        token. Tokens are pulled one at a time, so `w` can be a lazy stream.
+
+        By default returns the right parse and the list of operations, to be
+        evaluated later by `evaluate_reverse_parse`. With `evaluate=True` the
+        synthesized attributes are computed during the reductions and the
+        value of the start symbol (the AST) is returned instead; the right
+        parse and the operations are only built if `get_parse` is also set,
+        and then `(ast, parse, operations)` is returned.
+        """
+        action_table = self.action
+        goto_table = self.chained_goto
+        chains = self.chains
+        terminal_ids = self.terminal_ids
+        n_terminals = len(self.terminals)
+        n_nonterminals = len(self.nonterminal_ids)
+        lengths = self.production_lengths
+        lefts = self.production_lefts
+        productions = self.G.Productions
+        rules = self.production_rules
+        code_bits, code_mask = self.CODE_BITS, self.CODE_MASK
+        SHIFT, REDUCE, OK = self.SHIFT_CODE, self.REDUCE_CODE, self.OK_CODE
+        verbose = self.verbose
+        get_parse = get_parse or not evaluate
+        assert not evaluate or rules is not None, 'Only attributed grammars can be evaluated.'
+
+        stats = self.observer() if self.observer is not None else None
+        if stats is not None:
+            reductions = stats.parsing(productions)
+            if evaluate:
+                rules = stats.timed_rules(rules, productions)
+
         stack = [ 0 ]
-        cursor = 0
+        values = []
         output = []
         operations = []
+        push = stack.append
+        emit = output.append
+        log = operations.append
+
+        state = 0
+        tokens = iter(w)
+        token = next(tokens)
+        row = terminal_ids.get(token.token_type)
 
         while True:
-            state = stack[-1]
-            lookahead = w[cursor].token_type
-            lex = w[cursor].lex
-            if self.verbose: print(stack, w[cursor:])
-            
-            try:
-                action, tag = self.action[state, lookahead]
-            except KeyError:
-                raise Exception(f'Cannot understand the {lookahead} {lex}')
-                
-            # Your code here!!! (Shift case)
-            if action == self.SHIFT:
-                stack.append(tag)
-                cursor += 1
-            
-            # Your code here!!! (Reduce case)
-            elif action == self.REDUCE:
-                prod = tag
-                for _ in prod.Right:
-                    stack.pop()
-                output.append(prod)
-                stack.append(self.goto[stack[-1], prod.Left])
-            
-            # Your code here!!! (OK case)
-            elif action == self.OK: 
+            if verbose: print(stack, token)
+
+            if row is None:
+                raise Exception(f'Cannot understand the {token.token_type} {token.lex}')
+            code = action_table[state * n_terminals + row]
+            action = code & code_mask
+
+            if action == REDUCE:
+                prod = code >> code_bits
+                length = lengths[prod]
+                if stats is not None:
+                    reductions[prod] += 1
+                del stack[len(stack) - length:]
+                state = goto_table[stack[-1] * n_nonterminals + lefts[prod]]
+                chain = None
+                if state < 0:
+                    # The pass-through reductions that follow are made at
+                    # once, they don't change the values
+                    state, chain = chains[-2 - state][row]
+                push(state)
+                if evaluate:
+                    if length:
+                        synteticed = [None] + values[-length:]
+                        values[-length:] = [rules[prod](None, synteticed)]
+                    else:
+                        values.append(rules[prod](None, None))
+                if get_parse:
+                    emit(productions[prod])
+                    log(self.REDUCE)
+                if chain:
+                    if stats is not None:
+                        for unit in chain:
+                            reductions[unit] += 1
+                    if get_parse:
+                        for unit in chain:
+                            emit(productions[unit])
+                            log(self.REDUCE)
+
+            elif action == SHIFT:
+                state = code >> code_bits
+                push(state)
+                if stats is not None:
+                    stats.shifts += 1
+                if evaluate:
+                    values.append(token.lex)
+                token = next(tokens)
+                row = terminal_ids.get(token.token_type)
+                if get_parse:
+                    log(self.SHIFT)
+
+            elif action == OK:
                 stack.pop()
                 assert len(stack) == 1 and stack[-1] == 0
-                return output, operations
-            
-            # Your code here!!! (Invalid case)
-            else: raise Exception()
-            
-            operations.append(action)
-
-def expand(item, firsts):
-    next_symbol = item.NextSymbol
-    if next_symbol is None or not next_symbol.IsNonTerminal:
-        return []
-    
-    lookaheads = ContainerSet()
-    
-    for prev in item.Preview():
-        lookaheads.update(compute_local_first(firsts, prev))            
-    
-    assert not lookaheads.contains_epsilon
-        
-    return [Item(prod, 0, lookaheads) for prod in next_symbol.productions]
+                if not evaluate:
+                    return output, operations
+                assert len(values) == 1
+                if get_parse:
+                    return values[0], output, operations
+                return values[0]
+
+            else:
+                raise Exception(f'Cannot understand the {token.token_type} {token.lex}')
 
 def compress(items):
     centers = {}
@@ -85,20 +294,125 @@ def compress(items):
     
     return { Item(x.production, x.pos, set(lookahead)) for x, lookahead in centers.items() }
 
-def closure_lr1(items, firsts):
-    closure = ContainerSet(*items)
-    
-    changed = True
-    while changed:
-        changed = False
-        
-        new_items = ContainerSet()
-        for item in closure:
-            new_items.extend(expand(item, firsts))
+class ItemTable:
+    """
+    Interning table of the LR(1) items of a grammar.
 
-        changed = closure.update(new_items)
-        
-    return compress(closure)
+    Every distinct item (production, position and lookaheads) is created
+    once and gets an integer `id`, so kernels can be identified by the
+    sorted tuple of the ids of their items. Productions are identified by
+    their order of arrival. The table also caches, for each position of a
+    production, the productions of the nonterminal after it and the FIRST of
+    the rest of the production, as a bitmask of the terminal index of
+    `firsts`.
+    """
+    def __init__(self, firsts):
+        self.firsts = firsts
+        self.index = firsts.index
+        self.production_ids = {}
+        self.productions = []
+        self.items = {}
+        self.keys = []
+        self.steps = {}
+
+    def production_id(self, production):
+        try:
+            return self.production_ids[id(production)]
+        except KeyError:
+            pid = self.production_ids[id(production)] = len(self.productions)
+            self.productions.append(production)
+            return pid
+
+    def item(self, pid, pos, mask):
+        key = (pid, pos, mask)
+        try:
+            return self.items[key]
+        except KeyError:
+            item = self.items[key] = Item(self.productions[pid], pos, self.index.decode(mask))
+            item.id = len(self.keys)
+            self.keys.append(key)
+            return item
+
+    def key(self, item):
+        # (production id, position, lookaheads mask) of any item
+        try:
+            key = self.keys[item.id]
+            if self.items[key] is item:
+                return key
+        except (AttributeError, IndexError):
+            pass
+        return self.production_id(item.production), item.pos, self.index.mask(item.lookaheads)
+
+    def intern(self, item):
+        return self.item(*self.key(item))
+
+    def next(self, item):
+        pid, pos, mask = self.key(item)
+        return self.item(pid, pos + 1, mask)
+
+    def kernel(self, items):
+        return tuple(sorted(item.id for item in items))
+
+    def step(self, pid, pos):
+        """
+        The ids of the productions that expand the symbol after `pos` and the
+        FIRST of the symbols after it, with whether they derive epsilon.
+        None if there is no nonterminal after `pos`.
+        """
+        try:
+            return self.steps[pid, pos]
+        except KeyError:
+            pass
+        right = self.productions[pid].Right
+        step = None
+        if pos < len(right) and right[pos].IsNonTerminal:
+            first = compute_local_first(self.firsts, right[pos + 1:])
+            expansions = [ self.production_id(production) for production in right[pos].productions ]
+            step = (expansions, first.mask, first.contains_epsilon)
+        self.steps[pid, pos] = step
+        return step
+
+def closure_lr1(items, firsts, table=None):
+    """
+    Closure of the LR(1) `items`, with the items of the same center merged.
+
+    Only the lookaheads that an item gets for the first time are propagated
+    to the items it expands, so every item is expanded once per new set of
+    lookaheads instead of once per round. The lookaheads are bitmasks of the
+    terminal index of `firsts`, as given by `compute_firsts`. The items are
+    interned in `table`, which can be shared by the closures of the same
+    grammar.
+    """
+    if table is None:
+        table = ItemTable(firsts)
+    step = table.step
+    lookaheads = {}
+    pending = []
+    for item in items:
+        pid, pos, mask = table.key(item)
+        known = lookaheads.setdefault((pid, pos), 0)
+        new = mask & ~known
+        if new:
+            lookaheads[pid, pos] = known | new
+            pending.append((pid, pos, new))
+
+    while pending:
+        pid, pos, new = pending.pop()
+        expansion = step(pid, pos)
+        if expansion is None:
+            continue
+        expansions, first, nullable = expansion
+        propagated = first | new if nullable else first
+
+        for expanded in expansions:
+            known = lookaheads.setdefault((expanded, 0), 0)
+            new = propagated & ~known
+            if new:
+                lookaheads[expanded, 0] = known | new
+                pending.append((expanded, 0, new))
+
+    interned = table.item
+    return { interned(pid, pos, mask) for (pid, pos), mask in lookaheads.items() }
 
 def goto_lr1(items, symbol, firsts=None, just_kernel=False):
     assert just_kernel or firsts is not None, '`firsts` must be provided if `just_kernel=False`'
@@ -109,69 +423,256 @@ def build_LR1_automaton(G):
     assert len(G.startSymbol.productions) == 1, 'Grammar must be augmented'
     
     firsts = compute_firsts(G)
-    firsts[G.EOF] = ContainerSet(G.EOF)
+    table = ItemTable(firsts)
     
     start_production = G.startSymbol.productions[0]
-    start_item = Item(start_production, 0, lookaheads=(G.EOF,))
-    start = frozenset([start_item])
+    start_item = table.intern(Item(start_production, 0, lookaheads=(G.EOF,)))
+    start = table.kernel([ start_item ])
     
-    closure = closure_lr1(start, firsts)
+    closure = closure_lr1([ start_item ], firsts, table)
     automaton = State(frozenset(closure), True)
     
     pending = [ start ]
+    # Every kernel is closed once, its closure is kept in its state. Kernels
+    # are identified by the ids of their items
     visited = { start: automaton }
+    symbols = G.terminals + G.nonTerminals
     
     while pending:
         current = pending.pop()
         current_state = visited[current]
-        
-        closure = closure_lr1(current, firsts)
-        for symbol in G.terminals + G.nonTerminals:
-            new_items = frozenset(goto_lr1(closure, symbol, just_kernel=True))
-            if not new_items:
+
+        # The kernels of the gotos of every symbol, in a single pass
+        gotos = {}
+        for item in current_state.state:
+            symbol = item.NextSymbol
+            if symbol is not None:
+                try:
+                    gotos[symbol].append(table.next(item))
+                except KeyError:
+                    gotos[symbol] = [ table.next(item) ]
+
+        for symbol in symbols:
+            try:
+                new_items = gotos[symbol]
+            except KeyError:
                 continue
+            kernel = table.kernel(new_items)
             try:
-                next_state = visited[new_items]
+                next_state = visited[kernel]
             except KeyError:
-                pending.append(new_items)
-                next_state = State(frozenset(closure_lr1(new_items, firsts)), True)
-                visited[new_items] = next_state 
+                pending.append(kernel)
+                next_state = State(frozenset(closure_lr1(new_items, firsts, table)), True)
+                visited[kernel] = next_state 
             current_state.add_transition(symbol.Name, next_state)
     
     # automaton.set_formatter(multiline_formatter)
     return automaton
 
+def build_LALR1_automaton(G):
+    lr1_automaton = build_LR1_automaton(G)
+
+    # States with the same core (the items without lookaheads) are merged
+    # into a single state holding the union of their lookaheads
+    cores = {}
+    for node in lr1_automaton:
+        core = frozenset(item.Center() for item in node.state)
+        try:
+            cores[core].append(node)
+        except KeyError:
+            cores[core] = [ node ]
+
+    merged = {}
+    for nodes in cores.values():
+        state = State(frozenset(compress(item for node in nodes for item in node.state)), True)
+        # The LR(1) states it comes from, to tell the conflicts of the
+        # grammar from the ones caused by merging them
+        state.sources = nodes
+        for node in nodes:
+            merged[id(node)] = state
+
+    # The transitions of states with the same core go to states with the
+    # same core, so they can be copied from any of the merged states
+    for node in lr1_automaton:
+        state = merged[id(node)]
+        for symbol, (destination,) in node.transitions.items():
+            if not state.has_transition(symbol):
+                state.add_transition(symbol, merged[id(destination)])
+
+    return merged[id(lr1_automaton)]
+
+class Conflict:
+    """
+    Actions of a parsing table cell that the precedences couldn't solve.
+
+    `actions` are `(SHIFT, state)`, `(REDUCE, production)` or `(OK, 0)`
+    tuples and `items` the items of the state that produce them.
+    """
+    def __init__(self, state, symbol, actions, items):
+        self.state = state
+        self.symbol = symbol
+        self.actions = actions
+        self.items = items
+
+    @property
+    def kind(self):
+        reduces = sum(action == ShiftReduceParser.REDUCE for action, _ in self.actions)
+        return 'Reduce-Reduce' if reduces > 1 else 'Shift-Reduce'
+
+    def __str__(self):
+        actions = '\n'.join(f'    {action} {tag!r}' for action, tag in self.actions)
+        items = '\n'.join(f'    {item}' for item in self.items)
+        return f'{self.kind} conflict in state {self.state} on "{self.symbol}":\n{actions}\n  items:\n{items}'
+
+class ConflictError(Exception):
+    """
+    Raised when the grammar isn't in the class of the parser. Holds every
+    `Conflict` of the table, not just the first one.
+    """
+    def __init__(self, conflicts, message):
+        Exception.__init__(self, message)
+        self.conflicts = conflicts
+
 class LR1Parser(ShiftReduceParser):
+    # Cell left without action, for the nonassociative operators
+    ERROR = ('ERROR', None)
+
+    def _build_automaton(self, G):
+        return build_LR1_automaton(G)
+
     def _build_parsing_table(self):
         G = self.G.AugmentedGrammar(True)
         
-        automaton = build_LR1_automaton(G)
+        automaton = self._build_automaton(G)
         # automaton.write_to('test.svg')
 
-        for i, node in enumerate(automaton):
+        nodes = list(automaton)
+        for i, node in enumerate(nodes):
             if self.verbose: print(i, '\t', '\n\t '.join(str(x) for x in node.state), '\n')
             node.idx = i
 
+        # Every action of a cell is collected before choosing one, so the
+        # result doesn't depend on the order of the items
+        candidates = {}
         for node in automaton:
             idx = node.idx
             for item in node.state:
-                # Your code here!!!
                 prod = item.production
                 if item.IsReduceItem:
                     if prod.Left == G.startSymbol:
-                        self._register(self.action, (idx, G.EOF), (self.OK, 0))
+                        self._candidate(candidates, (idx, G.EOF), (self.OK, 0), item)
                     else:
                         for symbol in item.lookaheads:
-                            self._register(self.action, (idx, symbol), (self.REDUCE, prod))
+                            self._candidate(candidates, (idx, symbol), (self.REDUCE, prod), item)
                 else:
                     next_symb = item.NextSymbol
                     if next_symb.IsTerminal:
-                        self._register(self.action, (idx, next_symb), (self.SHIFT, node.transitions[next_symb.Name][0].idx))
+                        self._candidate(candidates, (idx, next_symb), (self.SHIFT, node.transitions[next_symb.Name][0].idx), item)
                     else:
-                        self._register(self.goto, (idx, next_symb), node.transitions[next_symb.Name][0].idx)
-    
-        
-    @staticmethod
-    def _register(table, key, value):
-        assert key not in table or table[key] == value, 'Shift-Reduce or Reduce-Reduce conflict!!!'
-        table[key] = value
\ No newline at end of file
+                        self.goto[idx, next_symb] = node.transitions[next_symb.Name][0].idx
+
+        conflicts = []
+        for key in sorted(candidates, key=lambda key: (key[0], self.terminal_ids[key[1]])):
+            cell = candidates[key]
+            actions = list(cell)
+            action = actions[0] if len(actions) == 1 else self._resolve(G, key[1], actions)
+            if action is None:
+                state, symbol = key
+                items = sorted({ str(item) for items in cell.values() for item in items })
+                conflicts.append(Conflict(state, symbol, actions, items))
+            elif action != self.ERROR:
+                self.action[key] = action
+
+        if conflicts:
+            raise ConflictError(conflicts, '\n\n'.join(self._conflict_message(conflict, nodes[conflict.state]) for conflict in conflicts))
+
+    def _candidate(self, candidates, key, action, item):
+        # Actions of the cell `key`, with the items that produce each one
+        try:
+            cell = candidates[key]
+        except KeyError:
+            cell = candidates[key] = {}
+        try:
+            cell[action].append(item)
+        except KeyError:
+            cell[action] = [ item ]
+
+    def _resolve(self, G, symbol, actions):
+        """
+        Chooses the action of a cell with a shift and a reduce using the
+        precedences of the grammar, like yacc: the highest precedence wins
+        and, if they are the same, the associativity says what to do.
+        Returns `ERROR` if the cell must be left empty and None if it is a
+        conflict.
+        """
+        shifts = [ action for action in actions if action[0] == self.SHIFT ]
+        reduces = [ action for action in actions if action[0] == self.REDUCE ]
+        if len(shifts) != 1 or len(reduces) != 1 or len(actions) != 2:
+            return None
+
+        token = G.precedence.get(symbol)
+        rule = G.ProductionPrecedence(reduces[0][1])
+        if token is None or rule is None:
+            return None
+        (token_level, associativity), (rule_level, _) = token, rule
+        if rule_level != token_level:
+            return reduces[0] if rule_level > token_level else shifts[0]
+        if associativity == 'left':
+            return reduces[0]
+        if associativity == 'right':
+            return shifts[0]
+        return self.ERROR
+
+    def _conflict_message(self, conflict, node):
+        # `node` is the state of the automaton with the conflict
+        return str(conflict)
+
+class LALRParser(LR1Parser):
+    def _build_automaton(self, G):
+        return build_LALR1_automaton(G)
+
+    def _conflict_message(self, conflict, node):
+        message = super()._conflict_message(conflict, node)
+        if conflict.kind == 'Reduce-Reduce' and not any(self._has_conflict(source, conflict) for source in node.sources):
+            # Merging states can only add reduce-reduce conflicts
+            message += '\nintroduced by merging LR(1) states with the same core (the grammar is not LALR(1))'
+        return message
+
+    def _has_conflict(self, node, conflict):
+        # Whether the LR(1) state reduces by two of the productions of the
+        # conflict on the same symbol
+        reduces = { tag for action, tag in conflict.actions if action == self.REDUCE }
+        found = { item.production for item in node.state
+                  if item.IsReduceItem and item.production in reduces and conflict.symbol in item.lookaheads }
+        return len(found) > 1
+
+
+# Process-wide parser registry. A parser is built once per (parser type,
+# grammar fingerprint, semantic rules) and the same instance is handed to every
+# caller; the rules are part of the key because the parser evaluates the ones
+# of the grammar it was built from. `ShiftReduceParser.__call__` keeps all of
+# its state in locals, which makes the shared instance safe to use from
+# several threads at the same time.
+_parsers = {}
+_parsers_lock = threading.Lock()
+
+def get_parser(G, parser_type=LR1Parser, table_file=None):
+    key = (parser_type, G.fingerprint, G.rules)
+    try:
+        return _parsers[key]
+    except KeyError:
+        pass
+
+    with _parsers_lock:
+        try:
+            return _parsers[key]
+        except KeyError:
+            parser = _parsers[key] = parser_type(G, table_file=table_file)
+            return parser
+
+def warm_up(G, parser_type=LR1Parser, table_file=None, background=False):
+    if not background:
+        return get_parser(G, parser_type, table_file)
+    thread = threading.Thread(target=get_parser, args=(G, parser_type, table_file), daemon=True)
+    thread.start()
+    return thread
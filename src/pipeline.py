@@ -0,0 +1,292 @@
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from src.tools.semantic import Scope
+from src.visitor.type_collector import TypeCollector
+from src.visitor.type_builder import TypeBuilder
+from src.visitor.var_collector import VarCollector
+from src.visitor.autotype_visitor import AutoTypeVisitor
+from src.visitor.type_checker import TypeChecker
+
+
+class PassStats:
+    __slots__ = ('time', 'nodes')
+
+    def __init__(self):
+        self.time = 0.0
+        self.nodes = 0
+
+    def __str__(self):
+        return f'{self.time * 1000:.2f}ms, {self.nodes} nodes'
+
+    def __repr__(self):
+        return str(self)
+
+
+class SemanticPass:
+    """
+    A pass of the semantic analysis, run class by class.
+
+    `requires` names the passes that must have visited the whole program
+    before this one starts. `finish` runs once every class was visited and
+    `finish_class` after it, for every class.
+    """
+    name = None
+    requires = ()
+
+    def __init__(self):
+        self.checker = None
+
+    def begin(self, pipeline):
+        pass
+
+    def visit_class(self, pipeline, node, index):
+        self.checker.visit(node, pipeline.scope.children[index])
+
+    def finish(self, pipeline):
+        pass
+
+    def finish_class(self, pipeline, node, index):
+        pass
+
+
+class CollectTypes(SemanticPass):
+    name = 'collector'
+
+    def begin(self, pipeline):
+        self.checker = TypeCollector(pipeline.errors)
+        if pipeline.context is None:
+            pipeline.context = self.checker.create_context()
+        self.checker.context = pipeline.context
+
+    def visit_class(self, pipeline, node, index):
+        self.checker.visit(node)
+
+
+class BuildTypes(SemanticPass):
+    name = 'builder'
+    requires = ('collector',)
+
+    def begin(self, pipeline):
+        self.checker = TypeBuilder(pipeline.context, pipeline.errors)
+
+    def visit_class(self, pipeline, node, index):
+        self.checker.visit(node)
+
+    def finish(self, pipeline):
+        pipeline.context.build_hierarchy()
+
+
+class CollectVars(SemanticPass):
+    # The var collector also resolves SELF_TYPE while it walks the class
+    name = 'vars'
+    requires = ('builder',)
+
+    def begin(self, pipeline):
+        self.checker = VarCollector(pipeline.context, pipeline.errors)
+        if pipeline.scope is None:
+            pipeline.scope = Scope()
+
+    def visit_class(self, pipeline, node, index):
+        scope = Scope(pipeline.scope)
+        children = pipeline.scope.children
+        if index < len(children):
+            children[index] = scope
+        else:
+            children.append(scope)
+        self.checker.visit(node, scope)
+
+
+class AutoTypes(SemanticPass):
+    # The inference of a class looks at the methods and attributes of the
+    # others, so every SELF_TYPE must be resolved before it starts. The
+    # features waiting for other inferences are solved at the end
+    name = 'autotype'
+    requires = ('vars',)
+
+    def begin(self, pipeline):
+        self.checker = AutoTypeVisitor(pipeline.context, pipeline.errors)
+
+    def finish(self, pipeline):
+        self.checker.solve()
+
+    def finish_class(self, pipeline, node, index):
+        self.checker._get_unnassigned(pipeline.scope.children[index])
+
+
+class CheckTypes(SemanticPass):
+    # The checker doesn't change the context nor the scopes, so with
+    # `jobs > 1` the classes are checked in forked processes, that get the
+    # analyzed program from the parent without copying it. The errors of
+    # each class are added in `finish_class`, in the same order as when
+    # they are checked one by one
+    name = 'checker'
+    requires = ('autotype',)
+
+    def begin(self, pipeline):
+        self.checker = TypeChecker(pipeline.context, pipeline.errors)
+        self.parallel = pipeline.jobs > 1 and 'fork' in multiprocessing.get_all_start_methods()
+        self.indices = []
+        self.results = {}
+
+    def visit_class(self, pipeline, node, index):
+        if self.parallel:
+            self.indices.append(index)
+        else:
+            SemanticPass.visit_class(self, pipeline, node, index)
+
+    def finish(self, pipeline):
+        if len(self.indices) < 2:
+            self.results = { index: _check_class(index, pipeline) for index in self.indices }
+            return
+
+        global _checked
+        _checked = pipeline
+        try:
+            executor = ProcessPoolExecutor(pipeline.jobs, multiprocessing.get_context('fork'))
+            with executor:
+                chunksize = max(1, len(self.indices) // (4 * pipeline.jobs))
+                results = executor.map(_check_class, self.indices, chunksize=chunksize)
+                self.results = dict(zip(self.indices, results))
+        finally:
+            _checked = None
+
+    def finish_class(self, pipeline, node, index):
+        pipeline.errors.extend(self.results.pop(index, ()))
+
+
+# Pipeline whose classes are being checked by the forked processes
+_checked = None
+
+def _check_class(index, pipeline=None):
+    pipeline = pipeline or _checked
+    errors = []
+    checker = TypeChecker(pipeline.context, errors)
+    checker.visit(pipeline.ast.declarations[index], pipeline.scope.children[index])
+    return errors
+
+
+PASSES = [ CollectTypes, BuildTypes, CollectVars, AutoTypes, CheckTypes ]
+
+
+def check_order(passes):
+    """
+    Raises a `ValueError` if a pass requires another one that does not run
+    before it.
+    """
+    done = set()
+    for p in passes:
+        for name in p.requires:
+            if name not in done:
+                raise ValueError(f'Pass "{p.name}" requires "{name}", which does not run before it')
+        done.add(p.name)
+
+
+class SemanticPipeline:
+    """
+    Runs the semantic passes in order, each one a walk over the whole
+    program, and keeps the time spent and the number of nodes visited by
+    every pass in `stats`. Nodes are only counted with `profile=True`.
+    Passes are not fused: the only walk saved is the resolution of
+    SELF_TYPE, done by hand in the var collector.
+
+    The errors are kept by pass and class, so `rerun` can analyze again
+    some classes of a program and keep the results of the others. With
+    `jobs > 1` the classes are type checked in that many processes.
+    """
+
+    def __init__(self, passes=PASSES, profile=False, jobs=1):
+        self.passes = [ p() for p in passes ]
+        check_order(self.passes)
+        self.profile = profile
+        self.jobs = jobs
+        self.ast = None
+        self.context = None
+        self.scope = None
+        self.errors = []
+        self.class_errors = []
+        self.pass_errors = []
+        self.stats = {}
+
+    def __call__(self, ast):
+        return self.run(ast)
+
+    def run(self, ast):
+        self.context = None
+        self.scope = None
+        self.class_errors = []
+        return self.rerun(ast, range(len(ast.declarations)))
+
+    def rerun(self, ast, indices):
+        """
+        Analyzes again the classes of `ast` in `indices`, with the context and
+        scope of the last run. The types of those classes must have been
+        removed from the context.
+        """
+        self.ast = ast
+        self.errors = []
+        self.stats = { p.name: PassStats() for p in self.passes }
+        self.pass_errors = [ [] for _ in self.passes ]
+        count = len(ast.declarations)
+        del self.class_errors[count:]
+        while len(self.class_errors) < count:
+            self.class_errors.append([ [] for _ in range(2 * len(self.passes)) ])
+
+        for number, p in enumerate(self.passes):
+            self._run_pass(number, p, ast, indices)
+
+        self.errors = [ error for number in range(len(self.passes)) for error in self._pass_errors(number) ]
+        return self.context, self.scope, self.errors
+
+    def _pass_errors(self, number):
+        # Same order they have when every class is analyzed
+        for errors in self.class_errors:
+            yield from errors[2 * number]
+        yield from self.pass_errors[number]
+        for errors in self.class_errors:
+            yield from errors[2 * number + 1]
+
+    def _run_pass(self, number, p, ast, indices):
+        stats = self.stats[p.name]
+        errors = self.errors
+        clock = time.perf_counter
+
+        start = clock()
+        p.begin(self)
+        if self.profile:
+            self._count(p.checker, stats)
+
+        for i in indices:
+            first = len(errors)
+            p.visit_class(self, ast.declarations[i], i)
+            self.class_errors[i][2 * number] = errors[first:]
+
+        first = len(errors)
+        p.finish(self)
+        self.pass_errors[number] = errors[first:]
+
+        for i in indices:
+            first = len(errors)
+            p.finish_class(self, ast.declarations[i], i)
+            self.class_errors[i][2 * number + 1] = errors[first:]
+        stats.time += clock() - start
+
+    def _count(self, checker, stats):
+        # The bound dispatcher is shadowed by a counting wrapper, so the
+        # recursive calls of the visitor are counted too
+        visit = checker.visit
+        def counted(*args):
+            stats.nodes += 1
+            return visit(*args)
+        checker.visit = counted
+
+    @property
+    def traversals(self):
+        return len(self.passes)
+
+    def report(self):
+        lines = [ f'{p.name}: {self.stats[p.name]}' for p in self.passes ]
+        total = sum(s.time for s in self.stats.values())
+        lines.append(f'{self.traversals} walks, {total * 1000:.2f}ms')
+        return '\n'.join(lines)
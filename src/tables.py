@@ -0,0 +1,37 @@
+import argparse
+import os
+import time
+
+from .cool_grammar import G
+from .lr1 import LR1Parser, LALRParser
+
+PARSERS = { 'lr1': LR1Parser, 'lalr': LALRParser }
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.cache')
+
+def table_file(parser='lr1'):
+    # Default location of the cached tables of each kind of parser
+    return os.path.join(CACHE_DIR, f'cool_{parser}.json')
+
+# Tables loaded by the server and the tools, which use the LR(1) parser
+TABLE_FILE = table_file('lr1')
+
+def build_tables(fname=TABLE_FILE, parser_type=LR1Parser):
+    parser = parser_type(G)
+    parser.save_tables(fname)
+    return parser
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description='Pre-generate the parsing tables of the COOL grammar.')
+    arg_parser.add_argument('-o', '--output', help='file where the tables are written, .cache/cool_<parser>.json by default')
+    arg_parser.add_argument('-p', '--parser', choices=PARSERS, default='lr1', help='kind of parsing tables to build')
+    args = arg_parser.parse_args(argv)
+    output = args.output or table_file(args.parser)
+
+    start = time.perf_counter()
+    parser = build_tables(output, PARSERS[args.parser])
+    elapsed = time.perf_counter() - start
+    print(f'{parser.states} states written to {output} in {elapsed:.2f}s')
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,14 @@
 from .cool_grammar import *
+from array import array
 import re
 
 class Token:
     """
     Basic token class.
 
+    Tokens don't know where they are, so the same object is shared by every
+    occurrence of a lexeme. Positions are kept by `TokenBuffer`.
+
     Parameters
     ----------
     lex : str
@@ -12,6 +16,7 @@ class Token:
     token_type : Enum
         Token's type.
     """
+    __slots__ = ('lex', 'token_type')
 
     def __init__(self, lex, token_type):
         self.lex = lex
@@ -28,8 +33,14 @@ class Token:
         return True
 
 class UnknownToken(Token):
-    def __init__(self, lex):
+    # Invalid tokens are rare, so they keep their own position for the
+    # error messages
+    __slots__ = ('line', 'column')
+
+    def __init__(self, lex, line=0, column=0):
         Token.__init__(self, lex, None)
+        self.line = line
+        self.column = column
 
     def transform_to(self, token_type):
         return Token(self.lex, token_type)
@@ -38,41 +49,226 @@ class UnknownToken(Token):
     def is_valid(self):
         return False
 
-def tokenizer(G, fixed_tokens):
-    def decorate(func):
-        def tokenize_text(text):
-            tokens = []
-            lex_string = []
-            start = False
-            for lex in text.split():
-                if not start and lex == '"':
-                    start = True
-                    lex_string = []
-                elif start and lex == '"':
-                    start = False
-                    pattern = ('[ ]+' + ('[ ]+'.join([w for w in lex_string]))) + ('[ ]+' if len(lex_string) else "")
-                    match = re.search(pattern, text).group()
-                    token = Token(match[1:-1] if len(match) > 2 else "", string)
-                elif start:
-                    lex_string.append(lex)
+    @property
+    def error(self):
+        return f'Invalid token "{self.lex}" at line {self.line}, column {self.column}'
+
+class TokenBuffer:
+    """
+    Tokens of a text, stored as a struct of arrays.
+
+    `tokens` holds references to shared `Token` objects and the line and
+    column of every occurrence are kept in parallel arrays. Behaves like a
+    read-only list of tokens.
+    """
+    __slots__ = ('tokens', 'lines', 'columns')
+
+    def __init__(self):
+        self.tokens = []
+        self.lines = array('I')
+        self.columns = array('I')
+
+    def append(self, token, line, column):
+        self.tokens.append(token)
+        self.lines.append(line)
+        self.columns.append(column)
+
+    def position(self, index):
+        return self.lines[index], self.columns[index]
+
+    def __len__(self):
+        return len(self.tokens)
+
+    def __getitem__(self, index):
+        return self.tokens[index]
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+    def __str__(self):
+        return str(self.tokens)
+
+    def __repr__(self):
+        return str(self)
+
+class LexicalError(Exception):
+    @property
+    def text(self):
+        return self.args[0]
+
+# Characters read at once when tokenizing a file object
+CHUNK_SIZE = 1 << 16
+
+class Lexer:
+    """
+    Single pass lexer driven by one compiled master regex.
+
+    Keywords and operators are taken from `fixed_tokens`, the type of any
+    other word or number is given by `classify`, which returns `None` for
+    invalid lexemes. Tokens don't need to be separated by spaces. Each
+    distinct lexeme gets a single `Token`, shared by all its occurrences.
+    """
+
+    def __init__(self, G, fixed_tokens, classify):
+        self.G = G
+        self.fixed_tokens = fixed_tokens
+        self.classify = classify
+
+        operators = '|'.join(re.escape(op) for op in sorted(fixed_tokens, key=len, reverse=True) if not op[0].isalpha())
+        # Every match skips the blanks before the token, so there is one
+        # match per token and one final match at the end of the text
+        self.pattern = re.compile(r'[ \t\r\f\v\n]*(?:' + '|'.join([
+            r'(?P<comment>--[^\n]*|\(\*[\s\S]*?\*\))',
+            r'(?P<string>"(?:[^"\\\n]|\\.)*")',
+            r'(?P<word>[a-zA-Z][a-zA-Z0-9_]*|\d+(?:\.\d+)?)',
+            # Unterminated strings and comments are reported as a single
+            # invalid token instead of one per character
+            r'(?P<unterminated>"(?:[^"\\\n]|\\.)*\\?|\(\*[\s\S]*)',
+            f'(?P<operator>{operators})',
+            r'(?P<unknown>[^ \t\r\f\v\n])',
+            r'(?P<eof>\Z)',
+        ]) + ')')
+
+    def __call__(self, text):
+        return self.tokenize(text)
+
+    def tokenize(self, text):
+        tokens = TokenBuffer()
+        append = tokens.append
+        for token, line, column in self._scan([ text ]):
+            append(token, line, column)
+        return tokens
+
+    def stream(self, source, chunk_size=CHUNK_SIZE, strict=False):
+        """
+        Lazily tokenizes a file object, reading it in chunks of `chunk_size`
+        characters, so only the current chunk is kept in memory. With
+        `strict=True` a `LexicalError` is raised as soon as an invalid token
+        is found.
+        """
+        chunks = iter(lambda: source.read(chunk_size), '')
+        for token, _, _ in self._scan(chunks):
+            if strict and token.token_type is None:
+                raise LexicalError(token.error)
+            yield token
+
+    def _scan(self, chunks):
+        # Yields every token with its line and column
+        classify = self.classify
+        # Token of every lexeme seen so far, starting with the fixed ones
+        known = self.fixed_tokens.copy()
+        strings = {}
+        chunks = iter(chunks)
+        buffer = ''
+        base = 0        # offset of `buffer` in the whole input
+        line = 1
+        line_start = 0  # offset in the whole input where `line` starts
+        # End of the comment that continues in the next chunks, if any. Its
+        # text is skipped as it is read instead of being scanned again
+        skip = None
+        comment_at = None
+
+        eof = False
+        while not eof:
+            chunk = next(chunks, None)
+            eof = chunk is None
+            if skip is not None:
+                # Only the last character is kept, it could be the start of
+                # the end of the comment
+                text = buffer + (chunk or '')
+                end = text.find(skip)
+                if end < 0:
+                    end = len(text) if eof else len(text) - len(skip) + 1
+                    if eof and skip == '*)':
+                        yield UnknownToken('(*', *comment_at), comment_at[0], comment_at[1]
                 else:
+                    end += len(skip) if skip == '*)' else 0
+                    skip = None
+                count = text.count('\n', 0, end)
+                if count:
+                    line += count
+                    line_start = base + text.rindex('\n', 0, end) + 1
+                buffer = text[end:]
+                base += end
+                if skip is not None and not eof:
+                    continue
+                skip = None
+            elif not eof:
+                buffer += chunk
+            newlines = [ match.start() for match in re.finditer('\n', buffer) ]
+            nl = 0
+            pos = 0
+
+            for match in self.pattern.finditer(buffer):
+                kind = match.lastgroup
+                start = match.start(kind)
+                while nl < len(newlines) and newlines[nl] < start:
+                    line += 1
+                    line_start = base + newlines[nl] + 1
+                    nl += 1
+                column = base + start - line_start + 1
+
+                # A token that ends too close to the end of the chunk could
+                # continue in the next one, so it is scanned again later. The
+                # blanks before it are dropped, and so is a comment that
+                # doesn't end in this chunk
+                if not eof and match.end() > len(buffer) - 2:
+                    pos = start
+                    lex = match.group(kind)
+                    if kind == 'unterminated' and lex.startswith('(*'):
+                        skip = '*)'
+                        comment_at = (line, column)
+                        pos = len(buffer) - min(1, len(lex) - 2)
+                    elif kind == 'comment' and lex.startswith('--') and match.end() == len(buffer):
+                        skip = '\n'
+                        pos = len(buffer)
+                    break
+                pos = match.end()
+
+                if kind == 'word':
+                    lex = match.group(kind)
+                    try:
+                        token = known[lex]
+                    except KeyError:
+                        token_type = classify(lex)
+                        if token_type is None:
+                            yield UnknownToken(lex, line, column), line, column
+                            continue
+                        token = known[lex] = Token(lex, token_type)
+                    yield token, line, column
+                elif kind == 'operator':
+                    yield known[match.group(kind)], line, column
+                elif kind == 'string':
+                    lex = match.group(kind)[1:-1]
                     try:
-                        token = fixed_tokens[lex]
+                        token = strings[lex]
                     except KeyError:
-                        token = UnknownToken(lex)
-                        try:
-                            token = func(token)
-                        except TypeError:
-                            pass
-                if not start:
-                    tokens.append(token)
-            tokens.append(Token('$', G.EOF))
-            return tokens
+                        token = strings[lex] = Token(lex, string)
+                    yield token, line, column
+                elif kind == 'unknown' or kind == 'unterminated':
+                    # An unterminated comment takes the rest of the input,
+                    # only its start is reported
+                    lex = match.group(kind)
+                    yield UnknownToken('(*' if lex.startswith('(*') else lex, line, column), line, column
+                elif kind == 'eof':
+                    yield Token('$', self.G.EOF), line, column
+                    return
+
+            # Lines ended inside the consumed text (i.e. by a comment) must be
+            # counted before dropping it
+            while nl < len(newlines) and newlines[nl] < pos:
+                line += 1
+                line_start = base + newlines[nl] + 1
+                nl += 1
+            buffer = buffer[pos:]
+            base += pos
 
+def tokenizer(G, fixed_tokens):
+    def decorate(func):
         if hasattr(func, '__call__'):
-            return tokenize_text
+            return Lexer(G, fixed_tokens, func)
         elif isinstance(func, str):
-            return tokenize_text(func)
+            return Lexer(G, fixed_tokens, lambda lex: None)(func)
         else:
             raise TypeError('Argument must be "str" or a callable object.')
     return decorate
@@ -81,19 +277,13 @@ fixed_tokens = { t.Name: Token(t.Name, t) for t in G.terminals if t not in { idx
 
 
 @tokenizer(G, fixed_tokens)
-def tokenize_text(token):
-    lex = token.lex
-    try:
-        float(lex)
-        return token.transform_to(num)
-    except ValueError:
-        if invalid_token(lex):
-            return UnknownToken(lex)
-        else:
-            return token.transform_to(idx)
+def tokenize_text(lex):
+    if lex[0].isdigit():
+        return num
+    return None if invalid_token(lex) else idx
 
 def invalid_token(lex):
-    return re.match('[a-zA-Z][a-zA-Z0-9]*', lex) is None
+    return re.fullmatch('[a-zA-Z][a-zA-Z0-9_]*', lex) is None
 
 def get_tokens(tokens):
     indent = 0
@@ -111,4 +301,4 @@ def get_tokens(tokens):
     return res + ' '.join([str(t.token_type) for t in pending])
 
 def get_errors(tokens):
-    return [f'Invalid token "{tok.lex}"' for tok in tokens if tok.token_type is None]
\ No newline at end of file
+    return [tok.error for tok in tokens if tok.token_type is None]
@@ -1,4 +1,5 @@
 import json
+import hashlib
 
 class Symbol(object):
 
@@ -244,6 +245,19 @@ class Production(object):
     def IsEpsilon(self):
         return self.Right.IsEpsilon
 
+    @property
+    def IsPassThrough(self):
+        # A unit production with a nonterminal body, its value is the one of
+        # the body
+        return len(self.Right) == 1 and self.Right[0].IsNonTerminal
+
+def pass_through(h, s):
+    """
+    Rule of the unit productions whose value is the one of their body. The
+    parsers don't run it, they skip the reductions by those productions.
+    """
+    return s[1]
+
 class AttributeProduction(Production):
 
     def __init__(self, nonTerminal, sentence, attributes):
@@ -268,6 +282,11 @@ class AttributeProduction(Production):
     def IsEpsilon(self):
         return self.Right.IsEpsilon
 
+    @property
+    def IsPassThrough(self):
+        # Only if the grammar says so, giving it the `pass_through` rule
+        return Production.IsPassThrough.fget(self) and self.attributes[0] is pass_through
+
     # sintetizar en ingles??????, pending aggrement
     def syntetice(self):
         pass
@@ -284,8 +303,17 @@ class Grammar():
         self.pType = None
         self.Epsilon = Epsilon(self)
         self.EOF = EOF(self)
+        # terminal -> (level, associativity), higher levels bind tighter
+        self.precedence = {}
 
         self.symbDict = { '$': self.EOF }
+        # fingerprint and rules, computed on demand and dropped on every change
+        self._fingerprint = None
+        self._rules = None
+
+    def _changed(self):
+        self._fingerprint = None
+        self._rules = None
 
     def NonTerminal(self, name, startSymbol = False):
 
@@ -304,6 +332,7 @@ class Grammar():
 
         self.nonTerminals.append(term)
         self.symbDict[name] = term
+        self._changed()
         return term
 
     def NonTerminals(self, names):
@@ -322,6 +351,7 @@ class Grammar():
 
         production.Left.productions.append(production)
         self.Productions.append(production)
+        self._changed()
 
 
     def Terminal(self, name):
@@ -333,6 +363,7 @@ class Grammar():
         term = Terminal(name, self)
         self.terminals.append(term)
         self.symbDict[name] = term
+        self._changed()
         return term
 
     def Terminals(self, names):
@@ -341,6 +372,35 @@ class Grammar():
 
         return ans
 
+    ASSOCIATIVITIES = ('left', 'right', 'nonassoc')
+
+    def Precedence(self, associativity, *terminals):
+        """
+        Declares the precedence and associativity of `terminals`, like the
+        %left, %right and %nonassoc declarations of yacc: every call gets a
+        higher level than the previous ones. Shift-reduce conflicts between
+        terminals and productions with precedence are solved with them when
+        the parsing table is built.
+        """
+        if associativity not in self.ASSOCIATIVITIES:
+            raise ValueError(f'Unknown associativity "{associativity}", use one of {self.ASSOCIATIVITIES}')
+        level = 1 + max((level for level, _ in self.precedence.values()), default=0)
+        for terminal in terminals:
+            if not isinstance(terminal, Terminal):
+                raise TypeError(f'Only terminals have precedence, "{terminal}" is not one')
+            self.precedence[terminal] = (level, associativity)
+        self._changed()
+
+    def ProductionPrecedence(self, production):
+        # The precedence of the rightmost terminal of the production that has
+        # one, or None
+        for symbol in reversed(tuple(production.Right)):
+            try:
+                return self.precedence[symbol]
+            except KeyError:
+                pass
+        return None
+
 
     def __str__(self):
 
@@ -391,6 +451,34 @@ class Grammar():
          # [{'Head':p.Left.Name, "Body": [s.Name for s in p.Right]} for p in self.Productions]
         return json.dumps(d)
 
+    @property
+    def fingerprint(self):
+        if self._fingerprint is None:
+            data = {
+                'Start': self.startSymbol.Name if self.startSymbol else None,
+                'Terminals': [t.Name for t in self.terminals],
+                'NonTerminals': [nt.Name for nt in self.nonTerminals],
+                'Productions': [[p.Left.Name] + [s.Name for s in p.Right] for p in self.Productions],
+            }
+            if self.precedence:
+                data['Precedence'] = [[t.Name, level, assoc] for t, (level, assoc) in self.precedence.items()]
+            self._fingerprint = hashlib.sha1(json.dumps(data).encode()).hexdigest()
+        return self._fingerprint
+
+    @property
+    def rules(self):
+        """
+        The semantic rule of every production, in order, or an empty tuple
+        if the grammar is not attributed. Two grammars with the same
+        fingerprint only build the same ASTs if their rules match too.
+        """
+        if self._rules is None:
+            if self.pType is AttributeProduction:
+                self._rules = tuple(p.attributes[0] for p in self.Productions)
+            else:
+                self._rules = ()
+        return self._rules
+
     @staticmethod
     def from_json(data):
         data = json.loads(data)
@@ -420,6 +508,7 @@ class Grammar():
         G.Epsilon = self.Epsilon
         G.EOF = self.EOF
         G.symbDict = self.symbDict.copy()
+        G.precedence = self.precedence.copy()
 
         return G
 
@@ -457,7 +546,8 @@ class Item:
     def __init__(self, production, pos, lookaheads=[]):
         self.production = production
         self.pos = pos
-        self.lookaheads = frozenset(look for look in lookaheads)
+        # Items made from the same lookaheads share the frozenset
+        self.lookaheads = lookaheads if isinstance(lookaheads, frozenset) else frozenset(lookaheads)
 
     def __str__(self):
         s = str(self.production.Left) + " -> "
@@ -481,11 +571,16 @@ class Item:
         return (
             (self.pos == other.pos) and
             (self.production == other.production) and
-            (set(self.lookaheads) == set(other.lookaheads))
+            (self.lookaheads == other.lookaheads)
         )
 
     def __hash__(self):
-        return hash((self.production,self.pos,self.lookaheads))
+        # Items don't change, the hash is computed once
+        try:
+            return self._hash
+        except AttributeError:
+            self._hash = hash((self.production,self.pos,self.lookaheads))
+            return self._hash
 
     @property
     def IsReduceItem(self):
@@ -1,4 +1,4 @@
-import itertools as itt
+import copy
 
 WRONG_SIGNATURE = 'Method "%s" already defined in "%s" with a different signature.'
 SELF_IS_READONLY = 'Variable "self" is read-only.'
@@ -14,6 +14,27 @@ BOPERATION_NOT_DEFINED = '%s operations are not defined between "%s" and "%s"'
 UOPERATION_NOT_DEFINED = '%s operations are not defined for "%s"'
 MISSING_PARAMETER = 'Missing argument "%s" in function call "%s"'
 TOO_MANY_ARGUMENTS = 'Too many arguments for function call "%s"'
+METHOD_NOT_DEFINED = 'Method "%s" is not defined in %s.'
+ATTRIBUTE_NOT_DEFINED = 'Attribute "%s" is not defined in %s.'
+
+class Generation:
+    """
+    Counts the changes to the types of a context, so the indexes built
+    before know they are outdated. `hierarchy` changes every time a type is
+    created or gets a new parent, and `members` also every time a member is
+    defined. Types outside a context have their own.
+    """
+
+    def __init__(self):
+        self.hierarchy = 0
+        self.members = 0
+
+    def hierarchy_changed(self):
+        self.hierarchy += 1
+        self.members += 1
+
+    def members_changed(self):
+        self.members += 1
 
 class SemanticError(Exception):
     @property
@@ -55,50 +76,104 @@ class MethodError(Method):
         return f'[method] {self.name} ERROR'
 
 class Type:
-    def __init__(self, name:str):
+    def __init__(self, name:str, parent=None):
         if name == 'ObjectType':
             return ObjectType()
         self.name = name
         self.attributes = []
         self.methods = {}
-        self.parent = ObjectType()
+        self.parent = ObjectType() if parent is None else parent
+        self.context = None
+        self.type_id = -1
+        self.generation = Generation()
+        self._init_members()
+
+    def _init_members(self):
+        self.attribute_map = {}
+        self._all_attributes = None
+        self._all_methods = None
+        self._members_version = -1
 
     def set_parent(self, parent):
-        if self.parent != ObjectType() and self.parent is not None:
+        if self.parent is not None and not isinstance(self.parent, ObjectType):
             raise SemanticError(f'Parent type is already set for {self.name}.')
         self.parent = parent
+        self.generation.hierarchy_changed()
+
+    def _members(self):
+        # Flattened tables with the own and inherited attributes and methods,
+        # built from the ones of the parent
+        chain = []
+        current = self
+        while current is not None and current._members_version != current.generation.members:
+            chain.append(current)
+            current = current.parent
+        attributes = {} if current is None else current._all_attributes
+        methods = {} if current is None else current._all_methods
+        for typex in reversed(chain):
+            # The own attributes go first, then the inherited ones from the
+            # closest class to the farthest
+            own = typex.attribute_map
+            attributes = { **own, **{ name: attr for name, attr in attributes.items() if name not in own } }
+            methods = { **methods, **typex.methods }
+            typex._all_attributes = attributes
+            typex._all_methods = methods
+            typex._members_version = typex.generation.members
+        return self._all_attributes, self._all_methods
+
+    def attribute_table(self):
+        # Own and inherited attributes by name. It's shared, don't modify it
+        return self._members()[0]
+
+    def all_attributes(self):
+        return list(self._members()[0].values())
+
+    def all_methods(self):
+        return list(self._members()[1].values())
+
+    def find_attribute(self, name:str):
+        # Same as get_attribute, but returns None if it isn't defined
+        if self._members_version == self.generation.members:
+            return self._all_attributes.get(name)
+        return self._members()[0].get(name)
+
+    def find_method(self, name:str):
+        # Same as get_method, but returns None if it isn't defined
+        if self._members_version == self.generation.members:
+            return self._all_methods.get(name)
+        return self._members()[1].get(name)
+
+    def _lookup(self, name, table):
+        # Walks the parents without building the flattened tables, which are
+        # outdated after every definition
+        current = self
+        while current is not None:
+            member = getattr(current, table).get(name)
+            if member is not None:
+                return member
+            current = current.parent
+        return None
 
     def get_attribute(self, name:str):
-        try:
-            return next(attr for attr in self.attributes if attr.name == name)
-        except StopIteration:
-            if self.parent is None:
-                raise SemanticError(f'Attribute "{name}" is not defined in {self.name}.')
-            try:
-                return self.parent.get_attribute(name)
-            except SemanticError:
-                raise SemanticError(f'Attribute "{name}" is not defined in {self.name}.')
+        attribute = self.find_attribute(name)
+        if attribute is None:
+            raise SemanticError(ATTRIBUTE_NOT_DEFINED % (name, self.name))
+        return attribute
 
     def define_attribute(self, name:str, typex):
-        try:
-            self.get_attribute(name)
-        except SemanticError:
-            attribute = Attribute(name, typex)
-            self.attributes.append(attribute)
-            return attribute
-        else:
+        if self._lookup(name, 'attribute_map') is not None:
             raise SemanticError(f'Attribute "{name}" is already defined in {self.name}.')
+        attribute = Attribute(name, typex)
+        self.attributes.append(attribute)
+        self.attribute_map[name] = attribute
+        self.generation.members_changed()
+        return attribute
 
     def get_method(self, name:str):
-        try:
-            return self.methods[name]
-        except KeyError:
-            if self.parent is None:
-                raise SemanticError(f'Method "{name}" is not defined in {self.name}.')
-            try:
-                return self.parent.get_method(name)
-            except SemanticError:
-                raise SemanticError(f'Method "{name}" is not defined in {self.name}.')
+        method = self.find_method(name)
+        if method is None:
+            raise SemanticError(METHOD_NOT_DEFINED % (name, self.name))
+        return method
 
     def define_method(self, name:str, param_names:list, param_types:list, return_type):
         if name in self.methods:
@@ -106,6 +181,7 @@ class Type:
             # raise SemanticError(f'Method "{name}" already defined in {self.name} with a different signature.')
 
         method = self.methods[name] = Method(name, param_names, param_types, return_type)
+        self.generation.members_changed()
         return method
 
     def change_type(self, method, nparm, newtype):
@@ -114,7 +190,15 @@ class Type:
                 
 
     def conforms_to(self, other):
-        return other.bypass() or self == other or self.parent is not None and self.parent.conforms_to(other)
+        if other.bypass():
+            return True
+        # The index of the context of either type, if it has both of them
+        for context in (self.context, other.context):
+            if context is not None:
+                conforms = context.hierarchy.conforms(self, other)
+                if conforms is not None:
+                    return conforms
+        return self == other or self.parent is not None and self.parent.conforms_to(other)
 
     def bypass(self):
         return False
@@ -136,8 +220,8 @@ class Type:
         return str(self)
 
 class ErrorType(Type):
-    def __init__(self):
-        Type.__init__(self, '<error>')
+    def __init__(self, parent=None):
+        Type.__init__(self, '<error>', parent)
 
     def conforms_to(self, other):
         return True
@@ -145,15 +229,9 @@ class ErrorType(Type):
     def bypass(self):
         return True
 
-    def __eq__(self, other):
-        return isinstance(other, ErrorType)
-
-    def __ne__(self, other):
-        return not isinstance(other, ErrorType)
-
 class VoidType(Type):
-    def __init__(self):
-        Type.__init__(self, '<void>')
+    def __init__(self, parent=None):
+        Type.__init__(self, '<void>', parent)
 
     def conforms_to(self, other):
         raise Exception('Invalid type: void type.')
@@ -161,49 +239,21 @@ class VoidType(Type):
     def bypass(self):
         return True
 
-    def __eq__(self, other):
-        return isinstance(other, VoidType)
-
 class BoolType(Type):
-    def __init__(self):
-        Type.__init__(self, 'Bool')
-
-    def __eq__(self, other):
-        return other.name == self.name or isinstance(other, BoolType)
-    
-    def __ne__(self, other):
-        return other.name != self.name and not isinstance(other, BoolType)
-
+    def __init__(self, parent=None):
+        Type.__init__(self, 'Bool', parent)
 
 class IntType(Type):
-    def __init__(self):
-        Type.__init__(self, 'Int')
-
-    def __eq__(self, other):
-        return other.name == self.name or isinstance(other, IntType)
-
-    def __ne__(self, other):
-        return other.name != self.name and not isinstance(other, IntType)
+    def __init__(self, parent=None):
+        Type.__init__(self, 'Int', parent)
 
 class StringType(Type):
-    def __init__(self):
-        Type.__init__(self, 'String')
-
-    def __eq__(self, other):
-        return other.name == self.name or isinstance(other, StringType)
-
-    def __ne__(self, other):
-        return other.name != self.name and not isinstance(other, StringType)
+    def __init__(self, parent=None):
+        Type.__init__(self, 'String', parent)
 
 class AutoType(Type):
-    def __init__(self):
-        Type.__init__(self, 'AUTO_TYPE')
-
-    def __eq__(self, other):
-        return other.name == self.name or isinstance(other, AutoType)
-
-    def __ne__(self, other):
-        return other.name != self.name and not isinstance(other, AutoType)
+    def __init__(self, parent=None):
+        Type.__init__(self, 'AUTO_TYPE', parent)
 
 class ObjectType(Type):
     def __init__(self):
@@ -211,24 +261,73 @@ class ObjectType(Type):
         self.attributes = []
         self.methods = {}
         self.parent = None
+        self.context = None
+        self.type_id = -1
+        self.generation = Generation()
+        self._init_members()
 
+class Context:
+    """
+    Types of a program.
 
-    def __eq__(self, other):
-        return other.name == self.name or isinstance(other, ObjectType)
-
-    def __ne__(self, other):
-        return other.name != self.name and not isinstance(other, ObjectType)
+    The builtin types are created once per context, and the analysis must
+    use these instances (`context.int_type`, `context.error_type`, ...)
+    instead of creating new ones, since types are compared by identity.
+    Every type gets an integer `type_id`, unique in its context.
+    """
 
-class Context:
     def __init__(self):
         self.types = {}
+        self.generation = Generation()
+        self._hierarchy = None
+        self._type_count = 0
+
+        self.object_type = self._add_id(ObjectType())
+        self.string_type = self._add_id(StringType(self.object_type))
+        self.int_type = self._add_id(IntType(self.object_type))
+        self.bool_type = self._add_id(BoolType(self.object_type))
+        self.auto_type = self._add_id(AutoType(self.object_type))
+        self.error_type = self._add_id(ErrorType(self.object_type))
+        self.void_type = self._add_id(VoidType(self.object_type))
+        for typex in [ self.string_type, self.int_type, self.object_type, self.bool_type, self.auto_type ]:
+            self.types[typex.name] = typex
+
+    def _add_id(self, typex):
+        # The changes to the types of the context are counted by the context
+        typex.context = self
+        typex.generation = self.generation
+        typex.type_id = self._type_count
+        self._type_count += 1
+        return typex
 
     def create_type(self, name:str):
         if name in self.types:
             raise SemanticError(f'Type with the same name ({name}) already in context.')
-        typex = self.types[name] = Type(name)
+        typex = self.types[name] = self._add_id(Type(name, self.object_type))
+        self.generation.hierarchy_changed()
         return typex
 
+    def copy(self):
+        # Context with the same types, whose types can be added or removed
+        # without changing this one. The shared types keep this context, the
+        # new ones get the copy and its own generation
+        context = copy.copy(self)
+        context.types = dict(self.types)
+        context.generation = Generation()
+        context._hierarchy = None
+        return context
+
+    @property
+    def hierarchy(self):
+        # Rebuilt only if a type was created or changed its parent
+        if self._hierarchy is None or not self._hierarchy.is_valid:
+            self.build_hierarchy()
+        return self._hierarchy
+
+    def build_hierarchy(self):
+        self._hierarchy = HierarchyIndex(self)
+        return self._hierarchy
+
     def get_type(self, name:str):
         try:
             return self.types[name]
@@ -241,6 +340,152 @@ class Context:
     def __repr__(self):
         return str(self)
 
+class HierarchyIndex:
+    """
+    Index of the inheritance tree of a context.
+
+    The types get the interval of their subtree in a preorder walk, so a type
+    conforms to another if its number is inside the interval of the other.
+    The common base type of two types is their lowest common ancestor: the
+    shallowest type between their first visits in the Euler tour of the tree,
+    found in constant time with a sparse table.
+
+    Types are looked up by name, and a query only uses the index if it gets
+    the same Type objects that were indexed: a copy of the context, or a
+    rerun of the analysis, can hold a different Type with the same name.
+    Types whose ancestors are not in the context (i.e. an error type) are
+    left out, and the queries on them return None.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.generation = context.generation.hierarchy
+        self.size = len(context.types)
+
+        types = context.types
+        children = { name: [] for name in types }
+        roots = []
+        for name in self._indexable(types):
+            parent = types[name].parent
+            if parent is None:
+                roots.append(name)
+            else:
+                children[parent.name].append(name)
+
+        self.ids = {}       # name -> preorder number
+        self.types = []     # preorder number -> type
+        self.last = []      # preorder number -> last number in its subtree
+        self.first = []     # preorder number -> first position in the tour
+        euler, depths = [], []
+
+        for root in roots:
+            if euler:
+                # Different trees are joined by a node that isn't a type
+                euler.append(-1)
+                depths.append(-1)
+            stack = [ (root, 0, iter(children[root])) ]
+            self._enter(root, types[root], len(euler))
+            euler.append(self.ids[root])
+            depths.append(0)
+            while stack:
+                name, depth, pending = stack[-1]
+                child = next(pending, None)
+                if child is None:
+                    stack.pop()
+                    self.last[self.ids[name]] = len(self.types) - 1
+                    if stack:
+                        euler.append(self.ids[stack[-1][0]])
+                        depths.append(depth - 1)
+                    continue
+                self._enter(child, types[child], len(euler))
+                euler.append(self.ids[child])
+                depths.append(depth + 1)
+                stack.append((child, depth + 1, iter(children[child])))
+
+        # sparse[k][i] is the shallowest position in euler[i:i + 2**k]
+        sparse = [ list(range(len(euler))) ]
+        k = 1
+        while 1 << k <= len(euler):
+            prev, half = sparse[-1], 1 << (k - 1)
+            row = []
+            for i in range(len(euler) - (1 << k) + 1):
+                a, b = prev[i], prev[i + half]
+                row.append(a if depths[a] <= depths[b] else b)
+            sparse.append(row)
+            k += 1
+        self.euler = euler
+        self.depths = depths
+        self.sparse = sparse
+
+    def _enter(self, name, typex, position):
+        self.ids[name] = len(self.types)
+        self.types.append(typex)
+        self.last.append(len(self.types) - 1)
+        self.first.append(position)
+
+    @staticmethod
+    def _indexable(types):
+        # Names of the types with every ancestor in the context, parents first
+        known = {}
+        order = []
+        for name in types:
+            path, seen = [], set()
+            current = name
+            ok = True
+            while current not in known:
+                parent = types[current].parent
+                if current in seen or parent is not None and parent.name not in types:
+                    ok = False
+                    break
+                path.append(current)
+                seen.add(current)
+                if parent is None:
+                    break
+                current = parent.name
+            else:
+                ok = known[current]
+            for n in reversed(path):
+                known[n] = ok
+                if ok:
+                    order.append(n)
+        return order
+
+    @property
+    def is_valid(self):
+        return self.generation == self.context.generation.hierarchy and self.size == len(self.context.types)
+
+    def _id(self, typex):
+        # Number of the type, or None if this index has another type with
+        # its name or none at all
+        i = self.ids.get(typex.name)
+        return i if i is not None and self.types[i] is typex else None
+
+    def conforms(self, typex, other):
+        i = self._id(typex)
+        j = self._id(other)
+        if i is None or j is None:
+            return None
+        return j <= i <= self.last[j]
+
+    def _lca(self, i, j):
+        left, right = self.first[i], self.first[j]
+        if left > right:
+            left, right = right, left
+        k = (right - left + 1).bit_length() - 1
+        a, b = self.sparse[k][left], self.sparse[k][right - (1 << k) + 1]
+        return self.euler[a if self.depths[a] <= self.depths[b] else b]
+
+    def common_basetype(self, types):
+        current = None
+        for typex in types:
+            i = self._id(typex)
+            if i is None:
+                return None
+            current = i if current is None else self._lca(current, i)
+            if current == -1:
+                return None
+        return None if current is None else self.types[current]
+
 class VariableInfo:
     def __init__(self, name, vtype):
         self.name = name
@@ -253,6 +498,20 @@ class VariableInfo:
         return str(self)
 
 class Scope:
+    """
+    Variables visible in a block of a program.
+
+    A scope only sees the variables its parent had when it was created, so
+    the lookups in the parent are limited to the first `index` positions.
+    `names` keeps the position and info of the first variable with each name,
+    and the lookups in the ancestors are memoized, since nothing defined
+    after the creation of a scope is visible from it.
+
+    The attributes a class inherits aren't copied into its scope: it keeps a
+    reference to the attribute table of the parent type, placed after the
+    variables the scope had when it inherited them.
+    """
+
     def __init__(self, parent=None):
         self.locals = []
         self.parent = parent
@@ -260,9 +519,15 @@ class Scope:
         self.expr_dict = { }
         self.functions = { }
         self.index = 0 if parent is None else len(parent)
+        self.names = { }
+        self.inherited = None
+        self.inherited_at = 0
+        self.resolved = { }
 
     def __len__(self):
-        return len(self.locals)
+        if self.inherited is None:
+            return len(self.locals)
+        return len(self.locals) + len(self.inherited)
 
     def __str__(self):
         res = ''
@@ -276,7 +541,7 @@ class Scope:
         return res
 
     def tab_level(self, tabs, name, num):
-        res = ('\t' * tabs) +  ('\n' + ('\t' * tabs)).join(str(local) for local in self.locals)
+        res = ('\t' * tabs) +  ('\n' + ('\t' * tabs)).join(str(local) for local in self.all_locals())
         if self.functions:
             children = '\n'.join(v.tab_level(tabs + 1, '[method] ' + k, num) for k, v in self.functions.items())
         else:
@@ -286,6 +551,14 @@ class Scope:
     def __repr__(self):
         return str(self)
 
+    def copy(self):
+        # Scope with the same variables and children, whose children can be
+        # replaced without changing this one
+        scope = copy.copy(self)
+        scope.children = list(self.children)
+        scope.resolved = dict(self.resolved)
+        return scope
+
     def create_child(self):
         child = Scope(self)
         self.children.append(child)
@@ -293,15 +566,27 @@ class Scope:
 
     def define_variable(self, vname, vtype):
         info = VariableInfo(vname, vtype)
-        self.locals.append(info)
+        self.define_attribute(info)
         return info
 
     def find_variable(self, vname, index=None):
-        locals = self.locals if index is None else itt.islice(self.locals, index)
+        entry = self.names.get(vname)
+        if entry is not None and (self.inherited is None or entry[0] < self.inherited_at):
+            if index is None or entry[0] < index:
+                return entry[1]
+            entry = None
+        if self.inherited is not None and (index is None or self.inherited_at < index):
+            attribute = self.inherited.get(vname)
+            if attribute is not None:
+                return attribute
+        if entry is not None and (index is None or entry[0] < index):
+            return entry[1]
+
         try:
-            return next(x for x in locals if x.name == vname)
-        except StopIteration:
-            return self.parent.find_variable(vname, self.index) if self.parent else None
+            return self.resolved[vname]
+        except KeyError:
+            info = self.resolved[vname] = self.parent.find_variable(vname, self.index) if self.parent is not None else None
+            return info
 
     def get_class_scope(self):
         if self.parent == None or self.parent.parent == None:
@@ -312,7 +597,26 @@ class Scope:
         return self.find_variable(vname) is not None
 
     def is_local(self, vname):
-        return any(True for x in self.locals if x.name == vname)
+        return vname in self.names or self.inherited is not None and vname in self.inherited
 
     def define_attribute(self, attr):
-        self.locals.append(attr)
\ No newline at end of file
+        if attr.name not in self.names:
+            self.names[attr.name] = (len(self), attr)
+        self.locals.append(attr)
+
+    def inherit(self, attributes):
+        """
+        Makes visible the inherited `attributes`, a table from names to
+        attributes shared with the other scopes, unless a variable with the
+        same name is already defined.
+        """
+        self.inherited = attributes
+        self.inherited_at = len(self.locals)
+
+    def all_locals(self):
+        # Own variables and inherited attributes, in definition order
+        if self.inherited is None:
+            return self.locals
+        at = self.inherited_at
+        inherited = [ attr for name, attr in self.inherited.items() if self.names.get(name, (at,))[0] >= at ]
+        return self.locals[:at] + inherited + self.locals[at:]
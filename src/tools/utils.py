@@ -60,8 +60,123 @@ class ContainerSet:
             return self.set == other
         return isinstance(other, ContainerSet) and self.set == other.set and self.contains_epsilon == other.contains_epsilon
 
+class TerminalIndex:
+    """
+    Dense ids of the terminals of a grammar, to store sets of them as
+    bitmasks: the terminal with id `i` is the bit `1 << i`.
+
+    Decoded masks are cached, so every mask is always decoded to the same
+    frozenset.
+    """
+    def __init__(self, terminals):
+        self.terminals = list(terminals)
+        self.bits = { terminal: 1 << i for i, terminal in enumerate(self.terminals) }
+        self.decoded = { 0: frozenset() }
+
+    def mask(self, terminals):
+        bits = self.bits
+        mask = 0
+        for terminal in terminals:
+            mask |= bits[terminal]
+        return mask
+
+    def decode(self, mask):
+        try:
+            return self.decoded[mask]
+        except KeyError:
+            pass
+        terminals = []
+        rest = mask
+        while rest:
+            low = rest & -rest
+            terminals.append(self.terminals[low.bit_length() - 1])
+            rest ^= low
+        result = self.decoded[mask] = frozenset(terminals)
+        return result
+
+class TerminalSet:
+    """
+    Same as `ContainerSet`, for terminals of a `TerminalIndex`. The set is a
+    bitmask, so unions and comparisons are single integer operations.
+    """
+    __slots__ = ('index', 'mask', 'contains_epsilon')
+
+    def __init__(self, index, *values, contains_epsilon=False):
+        self.index = index
+        self.mask = index.mask(values)
+        self.contains_epsilon = contains_epsilon
+
+    @property
+    def set(self):
+        return self.index.decode(self.mask)
+
+    def add(self, value):
+        mask = self.mask | self.index.bits[value]
+        changed = mask != self.mask
+        self.mask = mask
+        return changed
+
+    def extend(self, values):
+        mask = self.mask | self.index.mask(values)
+        changed = mask != self.mask
+        self.mask = mask
+        return changed
+
+    def set_epsilon(self, value=True):
+        last = self.contains_epsilon
+        self.contains_epsilon = value
+        return last != self.contains_epsilon
+
+    def update(self, other):
+        mask = self.mask | other.mask
+        changed = mask != self.mask
+        self.mask = mask
+        return changed
+
+    def epsilon_update(self, other):
+        return self.set_epsilon(self.contains_epsilon | other.contains_epsilon)
+
+    def hard_update(self, other):
+        return self.update(other) | self.epsilon_update(other)
+
+    def find_match(self, match):
+        return match if match in self else None
+
+    def __contains__(self, value):
+        bit = self.index.bits.get(value)
+        return bit is not None and self.mask & bit != 0
+
+    def __len__(self):
+        return self.mask.bit_count() + int(self.contains_epsilon)
+
+    def __str__(self):
+        return '%s-%s' % (str(set(self.set)), self.contains_epsilon)
+
+    def __repr__(self):
+        return str(self)
+
+    def __iter__(self):
+        return iter(self.set)
+
+    def __eq__(self, other):
+        if isinstance(other, TerminalSet):
+            return self.mask == other.mask and self.contains_epsilon == other.contains_epsilon
+        if isinstance(other, (set, frozenset)):
+            return self.set == other
+        return isinstance(other, ContainerSet) and self.set == other.set and self.contains_epsilon == other.contains_epsilon
+
+class Firsts(dict):
+    """
+    FIRST sets of the symbols and sentences of a grammar, as `TerminalSet`s
+    of `index`.
+    """
+    def __init__(self, index):
+        dict.__init__(self)
+        self.index = index
+
 def compute_local_first(firsts, alpha):
-    first_alpha = ContainerSet()
+    index = getattr(firsts, 'index', None)
+    first_alpha = ContainerSet() if index is None else TerminalSet(index)
     
     try:
         alpha_is_epsilon = alpha.IsEpsilon
@@ -85,14 +200,16 @@ def compute_local_first(firsts, alpha):
     return first_alpha
 
 def compute_firsts(G):
-    firsts = {}
+    # The end of the input is a terminal too for the lookaheads
+    index = TerminalIndex(G.terminals + [ G.EOF ] if G.EOF not in G.terminals else G.terminals)
+    firsts = Firsts(index)
     change = True
     
-    for terminal in G.terminals:
-        firsts[terminal] = ContainerSet(terminal)
+    for terminal in index.terminals:
+        firsts[terminal] = TerminalSet(index, terminal)
         
     for nonterminal in G.nonTerminals:
-        firsts[nonterminal] = ContainerSet()
+        firsts[nonterminal] = TerminalSet(index)
     
     while change:
         change = False
@@ -106,7 +223,7 @@ def compute_firsts(G):
             try:
                 first_alpha = firsts[alpha]
             except:
-                first_alpha = firsts[alpha] = ContainerSet()
+                first_alpha = firsts[alpha] = TerminalSet(index)
 
             local_first = compute_local_first(firsts, alpha)
             
@@ -127,6 +244,13 @@ def path_to_objet(typex):
     return path
 
 def get_common_basetype(types):
+    # The index of the first context that has all of the types
+    for context in dict.fromkeys(t.context for t in types):
+        if context is not None:
+            common = context.hierarchy.common_basetype(types)
+            if common is not None:
+                return common
+
     paths = [path_to_objet(typex) for typex in types]
     tuples = zip(*paths)
 
@@ -135,7 +259,9 @@ def get_common_basetype(types):
         if len(list(gr)) > 1:
             return paths[0][i-1]
 
-    return paths[0][-1]
+    # Every path is a prefix of the others, so the shortest one ends in the
+    # common type
+    return paths[0][min(len(path) for path in paths) - 1]
 
 def parse_tree_right(productions):
     
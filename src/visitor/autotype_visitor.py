@@ -2,18 +2,73 @@ from src.tools.semantic import *
 from src.tools.utils import get_common_basetype
 from src.tools.ast import *
 from src.visitor import visitor
+from collections import deque
 
 class AutoTypeVisitor(object):
+    """
+    Infers the AUTO_TYPE variables, attributes, parameters and return types.
+
+    Every attribute and method is visited once. While visiting a feature, the
+    variables and methods it finds still typed as AUTO_TYPE are recorded as
+    its dependencies, and when one of them gets a type, the features that
+    depend on it are visited again. The inference ends when no feature is
+    waiting, so what is resolved doesn't depend on the order of the classes.
+    """
     def __init__(self, context, errors=[]):
         self.context =  context
         self.errors = errors
         self.current_type = None
         self.current_method = None
+        # Attributes and methods, as (type, node, scope)
+        self.features = []
+        self.current_feature = None
+        # id of a variable or method -> features that read it as AUTO_TYPE
+        self.dependents = {}
+        self.pending = deque()
+        self.queued = set()
+        # Type name -> class scope, to find the scopes of the methods
+        self.class_scopes = None
+
+    def _depends_on(self, slot):
+        if self.current_feature is not None:
+            self.dependents.setdefault(id(slot), set()).add(self.current_feature)
+
+    def _changed(self, slot):
+        for feature in self.dependents.pop(id(slot), ()):
+            if feature not in self.queued:
+                self.queued.add(feature)
+                self.pending.append(feature)
+
+    def _set_type(self, varinfo, typex):
+        auto = varinfo.type == self.context.auto_type
+        varinfo.type = typex
+        if auto and typex != self.context.auto_type:
+            self._changed(varinfo)
+
+    def _set_return_type(self, method, typex):
+        auto = method.return_type == self.context.auto_type
+        method.return_type = typex
+        if auto and typex != self.context.auto_type:
+            self._changed(method)
+
+    def _visit_feature(self, index):
+        self.current_type, node, scope = self.features[index]
+        self.current_feature = index
+        self.visit(node, scope)
+        self.current_feature = None
+
+    def solve(self):
+        # Visits again the features whose dependencies got a type, until none
+        # is left
+        while self.pending:
+            feature = self.pending.popleft()
+            self.queued.discard(feature)
+            self._visit_feature(feature)
 
     def assign_auto_type(self, typex, node, scope, other_type):
         if isinstance(node, VariableNode):
             varinfo = scope.find_variable(node.lex)
-            varinfo.type = other_type
+            self._set_type(varinfo, other_type)
         elif isinstance(node, (BaseCallNode, CallNode, StaticCallNode)):
             if isinstance(node, BaseCallNode):
                 typex = self.context.get_type(node.type)
@@ -22,32 +77,52 @@ class AutoTypeVisitor(object):
             elif isinstance(node, CallNode):
                 typex = self.visit(node.obj, scope)
             meth = typex.get_method(node.id)
-            meth.return_type = other_type
+            self._set_return_type(meth, other_type)
+
+    def _return_type(self, method):
+        if method.return_type == self.context.auto_type:
+            self._depends_on(method)
+        return method.return_type
 
     def _get_method(self, typex, name):
-        try:
-            return typex.get_method(name)
-        except SemanticError as e:
-            return MethodError(name, [], [], ErrorType())
+        method = typex.find_method(name)
+        if method is None:
+            return MethodError(name, [], [], self.context.error_type)
+        return method
 
 
     def _get_unnassigned(self, scope):
-        for var in scope.locals:
+        for var in scope.all_locals():
             if var.type.name == 'AUTO_TYPE':
                 self.errors.append(AUTO_TYPE_ERROR % var.name)
         for child in scope.children:
             self._get_unnassigned(child)
 
 
+    def _method_scope(self, scope, typex, method):
+        # Scope of the method, which can be declared in another class
+        owner = typex
+        while owner is not None and owner.methods.get(method.name) is not method:
+            owner = owner.parent
+        if owner is None:
+            return None
+        if self.class_scopes is None:
+            program_scope = scope.get_class_scope().parent
+            self.class_scopes = { child.find_variable('self').type.name: child for child in program_scope.children }
+        class_scope = self.class_scopes.get(owner.name)
+        return None if class_scope is None else class_scope.functions.get(method.name)
+
     def _change_args(self, scope, stype, node):
         meth = self._get_method(stype, node.id)
         arg_types = [self.visit(arg, scope) for arg in node.args]
         
         for atype, ptype, pname in zip(arg_types, meth.param_types, meth.param_names):
-            if ptype == AutoType() and atype != AutoType():
-                scp = scope.get_class_scope().functions[node.id]
+            if ptype == self.context.auto_type and atype != self.context.auto_type:
+                scp = self._method_scope(scope, stype, meth)
+                if scp is None:
+                    continue
                 varinfo = scp.find_variable(pname)
-                varinfo.type = atype
+                self._set_type(varinfo, atype)
                 self.current_type.change_type(meth, pname, varinfo.type)
 
 
@@ -55,13 +130,13 @@ class AutoTypeVisitor(object):
         ltype = self.visit(node.left, scope)
 
         if ltype.name == 'AUTO_TYPE':
-            self.assign_auto_type(ltype, node.left, scope, IntType())
-            ltype = IntType()
+            self.assign_auto_type(ltype, node.left, scope, self.context.int_type)
+            ltype = self.context.int_type
         
         rtype = self.visit(node.right, scope)
         if rtype.name == 'AUTO_TYPE':
-            self.assign_auto_type(rtype, node.right, scope, IntType())
-            rtype = IntType()
+            self.assign_auto_type(rtype, node.right, scope, self.context.int_type)
+            rtype = self.context.int_type
         return ltype, rtype
 
 
@@ -73,6 +148,7 @@ class AutoTypeVisitor(object):
     def visit(self, node, scope):
         for declaration, child_scope in zip(node.declarations, scope.children):
             self.visit(declaration, child_scope)
+        self.solve()
         self._get_unnassigned(scope)
 
 
@@ -84,27 +160,29 @@ class AutoTypeVisitor(object):
 
         for feat in node.features:
             if isinstance(feat, AttrDeclarationNode):
-                self.visit(feat, scope)
+                self.features.append((self.current_type, feat, scope))
+                self._visit_feature(len(self.features) - 1)
 
         for feat, child_scope in zip(fd, scope.children):
-            self.visit(feat, child_scope)
+            self.features.append((self.current_type, feat, child_scope))
+            self._visit_feature(len(self.features) - 1)
 
 
     @visitor.when(AttrDeclarationNode)
     def visit(self, node, scope):
         varinfo = scope.find_variable(node.id)
         if varinfo.type.name == 'AUTO_TYPE' and node.expr is not None:
-            varinfo.type = self.visit(node.expr, scope)
+            self._set_type(varinfo, self.visit(node.expr, scope))
 
 
     @visitor.when(ConstantBoolNode)
     def visit(self, node, scope):
-        return BoolType()
+        return self.context.bool_type
 
 
     @visitor.when(ConstantStrNode)
     def visit(self, node, scope):
-        return StringType()
+        return self.context.string_type
 
 
     @visitor.when(FuncDeclarationNode)
@@ -118,8 +196,8 @@ class AutoTypeVisitor(object):
             if varinfo.type.name != ptype:
                 self.current_type.change_type(self.current_method, pname, varinfo.type)
 
-        if self.current_method.return_type == AutoType():
-            self.current_method.return_type = return_type
+        if self.current_method.return_type == self.context.auto_type:
+            self._set_return_type(self.current_method, return_type)
 
 
     @visitor.when(VarDeclarationNode)
@@ -129,7 +207,7 @@ class AutoTypeVisitor(object):
         if node.expr != None:
             typex = self.visit(node.expr, scope)
             if varinfo.type.name == 'AUTO_TYPE':
-                varinfo.type = typex
+                self._set_type(varinfo, typex)
             return typex
 
         return varinfo.type
@@ -140,7 +218,7 @@ class AutoTypeVisitor(object):
         typex = self.visit(node.expr, scope)
 
         if vinfo.type.name == 'AUTO_TYPE':
-            vinfo.type = typex 
+            self._set_type(vinfo, typex)
         return typex
 
 
@@ -149,7 +227,7 @@ class AutoTypeVisitor(object):
         stype = self.visit(node.obj, scope)
      
         self._change_args(scope, stype, node)
-        return self._get_method(stype, node.id).return_type
+        return self._return_type(self._get_method(stype, node.id))
 
 
     @visitor.when(BaseCallNode)
@@ -159,9 +237,9 @@ class AutoTypeVisitor(object):
         try:
             stype = self.context.get_type(node.id)
             self._change_args(scope, stype, node)
-            return self._get_method(stype, node.id).return_type
+            return self._return_type(self._get_method(stype, node.id))
         except SemanticError:
-            return ErrorType()
+            return self.context.error_type
 
 
     @visitor.when(StaticCallNode)
@@ -169,19 +247,19 @@ class AutoTypeVisitor(object):
         stype = self.current_type
 
         self._change_args(scope, stype, node)
-        return self._get_method(stype, node.id).return_type
+        return self._return_type(self._get_method(stype, node.id))
 
 
     @visitor.when(BinaryArithNode)
     def visit(self, node, scope):
         ltype, rtype = self._check_binary_node(node, scope)
-        return IntType() if ltype == rtype == IntType() else ErrorType()
+        return self.context.int_type if ltype == rtype == self.context.int_type else self.context.error_type
 
 
     @visitor.when(BinaryLogicalNode)
     def visit(self, node, scope):
         ltype, rtype = self._check_binary_node(node, scope)
-        return BoolType() if ltype == rtype == IntType() else ErrorType()
+        return self.context.bool_type if ltype == rtype == self.context.int_type else self.context.error_type
 
 
     @visitor.when(UnaryLogicalNode)
@@ -189,9 +267,9 @@ class AutoTypeVisitor(object):
         ltype = self.visit(node.expr, scope)
 
         if ltype.name == 'AUTO_TYPE':
-            self.assign_auto_type(ltype, node.expr, scope, BoolType())
-            ltype = BoolType()
-        return ltype if ltype == BoolType() else ErrorType()
+            self.assign_auto_type(ltype, node.expr, scope, self.context.bool_type)
+            ltype = self.context.bool_type
+        return ltype if ltype == self.context.bool_type else self.context.error_type
 
 
     @visitor.when(UnaryArithNode)
@@ -199,19 +277,22 @@ class AutoTypeVisitor(object):
         ltype = self.visit(node.expr, scope)
 
         if ltype.name == 'AUTO_TYPE':
-            self.assign_auto_type(ltype, node.expr, scope, IntType())
-            ltype = IntType()
-        return ltype if ltype == IntType() else ErrorType()
+            self.assign_auto_type(ltype, node.expr, scope, self.context.int_type)
+            ltype = self.context.int_type
+        return ltype if ltype == self.context.int_type else self.context.error_type
 
 
     @visitor.when(ConstantNumNode)
     def visit(self, node, scope):
-        return IntType()
+        return self.context.int_type
 
     
     @visitor.when(VariableNode)
     def visit(self, node, scope):
-        return scope.find_variable(node.lex).type
+        varinfo = scope.find_variable(node.lex)
+        if varinfo.type == self.context.auto_type:
+            self._depends_on(varinfo)
+        return varinfo.type
             
     
     @visitor.when(InstantiateNode)
@@ -222,7 +303,7 @@ class AutoTypeVisitor(object):
     @visitor.when(IsVoidNode)
     def visit(self, node, scope):
         self.visit(node.expr, scope)
-        return BoolType()
+        return self.context.bool_type
 
     @visitor.when(BlockNode)
     def visit(self, node, scope):
@@ -242,8 +323,8 @@ class AutoTypeVisitor(object):
     def visit(self, node, scope):
         typex = self.visit(node.cond, scope)
         
-        if typex == AutoType():
-            self.assign_auto_type(typex, node.cond, scope, BoolType())
+        if typex == self.context.auto_type:
+            self.assign_auto_type(typex, node.cond, scope, self.context.bool_type)
         
         self.visit(node.expr, scope)
         return self.context.get_type('Object')
@@ -283,6 +364,6 @@ class AutoTypeVisitor(object):
         typex = self.visit(node.expr, scope)
 
         if var_info.type.name == 'AUTO_TYPE':
-            var_info.type = typex
+            self._set_type(var_info, typex)
 
         return typex
\ No newline at end of file
@@ -19,6 +19,7 @@ class TypeBuilder:
     def visit(self, node):
         for dec in node.declarations:
             self.visit(dec)
+        self.context.build_hierarchy()
     
 
 
@@ -27,6 +28,7 @@ class TypeBuilder:
         try:
             self.current_type = self.context.get_type(node.id)
         except SemanticError as e:
+            # Not the context's error type, which must not get the members
             self.current_type = ErrorType()
             self.errors.append(e.text)
         
@@ -39,7 +41,7 @@ class TypeBuilder:
                         raise SemanticError(CIRCULAR_DEPENDENCY %(parent.name, self.current_type.name))
                     current = current.parent
             except SemanticError as e:
-                parent = ErrorType()
+                parent = self.context.error_type
                 self.errors.append(e.text)
             self.current_type.set_parent(parent)
 
@@ -57,13 +59,13 @@ class TypeBuilder:
                 args_names.append(name)
                 args_types.append(self.context.get_type(type_))
             except SemanticError as e:
-                args_types.append(ErrorType())
+                args_types.append(self.context.error_type)
                 self.errors.append(e.text)
         
         try:
             return_type = self.context.get_type(node.type)
         except SemanticError as e:
-            return_type = ErrorType()
+            return_type = self.context.error_type
             self.errors.append(e.text)
     
         try:
@@ -76,7 +78,7 @@ class TypeBuilder:
         try:
             attr_type = self.context.get_type(node.type)
         except SemanticError as e:
-            attr_type = ErrorType()
+            attr_type = self.context.error_type
             self.errors.append(e.text)
         
         try:
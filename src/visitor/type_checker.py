@@ -26,16 +26,16 @@ class TypeChecker:
             return self.context.get_type(ntype)
         except SemanticError as e:
             self.errors.append(e.text)
-            return ErrorType()
+            return self.context.error_type
 
 
     def _get_method(self, typex, name):
-        try:
-            return typex.get_method(name)
-        except SemanticError as e:
-            if typex != ErrorType() and typex != AutoType() :
-                self.errors.append(e.text)
-            return MethodError(name, [], [], ErrorType())
+        method = typex.find_method(name)
+        if method is None:
+            if typex != self.context.error_type and typex != self.context.auto_type :
+                self.errors.append(METHOD_NOT_DEFINED % (name, typex.name))
+            return MethodError(name, [], [], self.context.error_type)
+        return method
 
 
     @visitor.when(ClassDeclarationNode)
@@ -59,7 +59,7 @@ class TypeChecker:
             typex = self.visit(node.expr, scope)
             if not typex.conforms_to(varinfo.type):
                 self.errors.append(INCOMPATIBLE_TYPES %(typex.name, varinfo.type.name))
-                return ErrorType()
+                return self.context.error_type
             return typex
         return self._get_type(node.type)
 
@@ -71,17 +71,14 @@ class TypeChecker:
         ptypes = [param[1] for param in node.params]
 
         self.current_method = method = self.current_type.get_method(node.id)
-        if parent is not None:
-            try:
-                old_meth = parent.get_method(node.id)
-                if old_meth.return_type.name != method.return_type.name:
-                    if node.type != 'SELF_TYPE':
-                        self.errors.append(WRONG_SIGNATURE % (node.id, parent.name))
-                elif any(type1.name != type2.name for name, type1, type2 in zip(ptypes, method.param_types, old_meth.param_types)):
-                    if name != 'SELF_TYPE':
-                        self.errors.append(WRONG_SIGNATURE % (node.id, parent.name))
-            except SemanticError:
-                pass
+        old_meth = None if parent is None else parent.find_method(node.id)
+        if old_meth is not None:
+            if old_meth.return_type.name != method.return_type.name:
+                if node.type != 'SELF_TYPE':
+                    self.errors.append(WRONG_SIGNATURE % (node.id, parent.name))
+            elif any(type1.name != type2.name for name, type1, type2 in zip(ptypes, method.param_types, old_meth.param_types)):
+                if name != 'SELF_TYPE':
+                    self.errors.append(WRONG_SIGNATURE % (node.id, parent.name))
 
 
         result = self.visit(node.body, scope)
@@ -146,7 +143,7 @@ class TypeChecker:
 
         if not obj.conforms_to(typex):
             self.errors.append(INCOMPATIBLE_TYPES % (typex.name, obj.name))
-            return ErrorType()
+            return self.context.error_type
         
         meth = self._get_method(typex, node.id)
         self._check_args(meth, scope, node.args)
@@ -164,17 +161,17 @@ class TypeChecker:
 
     @visitor.when(ConstantNumNode)
     def visit(self, node, scope):
-        return IntType()
+        return self.context.int_type
 
 
     @visitor.when(ConstantBoolNode)
     def visit(self, node, scope):
-        return BoolType()
+        return self.context.bool_type
 
    
     @visitor.when(ConstantStrNode)
     def visit(self, node, scope):
-        return StringType()
+        return self.context.string_type
 
 
     @visitor.when(VariableNode)
@@ -199,7 +196,7 @@ class TypeChecker:
     @visitor.when(IsVoidNode)
     def visit(self, node, scope):
         self.visit(node.expr, scope)
-        return BoolType()
+        return self.context.bool_type
 
 
     @visitor.when(ConditionalNode)
@@ -218,7 +215,7 @@ class TypeChecker:
             return true_type
         else:
             self.errors.append(INCOMPATIBLE_TYPES % (false_type.name, true_type.name))
-            return ErrorType()
+            return self.context.error_type
         
 
     @visitor.when(BlockNode)
@@ -252,7 +249,7 @@ class TypeChecker:
         for t in var_types:
             if not type_expr.conforms_to(t):
                 self.errors.append(INCOMPATIBLE_TYPES % (t.name, type_expr.name))
-                return ErrorType()
+                return self.context.error_type
 
         return get_common_basetype(types)
         
@@ -268,38 +265,38 @@ class TypeChecker:
     def visit(self, node, scope):
         ltype = self.visit(node.left, scope)
         rtype = self.visit(node.right, scope)
-        if ltype != rtype != IntType():
+        if ltype != rtype != self.context.int_type:
             self.errors.append(BOPERATION_NOT_DEFINED %('Arithmetic', ltype.name, rtype.name))
-            return ErrorType()
-        return IntType()
+            return self.context.error_type
+        return self.context.int_type
 
 
     @visitor.when(BinaryLogicalNode)
     def visit(self, node, scope):
         ltype = self.visit(node.left, scope)
         rtype = self.visit(node.right, scope)
-        if ltype != rtype != IntType():
+        if ltype != rtype != self.context.int_type:
             self.errors.append(BOPERATION_NOT_DEFINED %('Logical', ltype.name, rtype.name))
-            return ErrorType()
+            return self.context.error_type
 
-        return BoolType()
+        return self.context.bool_type
 
 
     @visitor.when(UnaryLogicalNode)
     def visit(self, node, scope):
         ltype = self.visit(node.expr, scope)
-        if ltype != BoolType():
+        if ltype != self.context.bool_type:
             self.errors.append(UOPERATION_NOT_DEFINED %('Logical', ltype.name))
-            return ErrorType()
+            return self.context.error_type
 
-        return BoolType()
+        return self.context.bool_type
 
 
 
     @visitor.when(UnaryArithNode)
     def visit(self, node, scope):
         ltype = self.visit(node.expr, scope)
-        if ltype != IntType():
+        if ltype != self.context.int_type:
             self.errors.append(UOPERATION_NOT_DEFINED %('Arithmetic', ltype.name))
-            return ErrorType()
-        return IntType()
\ No newline at end of file
+            return self.context.error_type
+        return self.context.int_type
\ No newline at end of file
@@ -10,19 +10,19 @@ class TypeCollector(object):
         self.context = None
         self.errors = errors
     
+    def create_context(self):
+        # The context already has the builtin types
+        self.context = Context()
+        self.context.create_type('SELF_TYPE')
+        return self.context
+
     @visitor.on('node')
     def visit(self, node):
         pass
     
     @visitor.when(ProgramNode)
     def visit(self, node):
-        self.context = Context()
-        self.context.types['String'] = StringType()
-        self.context.types['Int'] = IntType()
-        self.context.types['Object'] = ObjectType()
-        self.context.types['Bool'] = BoolType()
-        self.context.types['AUTO_TYPE'] = AutoType()
-        self.context.create_type('SELF_TYPE')
+        self.create_context()
         for dec in node.declarations:
             self.visit(dec)
 
@@ -3,6 +3,8 @@ from src.tools.ast import *
 from src.visitor import visitor
 
 class VarCollector:
+    # Also resolves SELF_TYPE, in the same walk: the variables, attributes and
+    # signatures declared with it get the type of the class being visited
     def __init__(self, context, errors=[]):
         self.context = context
         self.current_type = None
@@ -20,14 +22,6 @@ class VarCollector:
             self.visit(declaration, scope.create_child())
         return scope
 
-    
-    def copy_scope(self, scope, parent):
-        if parent is None:
-            return
-        for attr in parent.attributes:
-            if scope.find_variable(attr.name) is None:
-                scope.define_attribute(attr)
-        self.copy_scope(scope, parent.parent)
 
 
     @visitor.when(ClassDeclarationNode)
@@ -39,7 +33,9 @@ class VarCollector:
             if isinstance(feat, AttrDeclarationNode):
                 self.visit(feat, scope)
         
-        self.copy_scope(scope, self.current_type.parent)
+        # The inherited attributes are shared with the parent type
+        if self.current_type.parent is not None:
+            scope.inherit(self.current_type.parent.attribute_table())
         
         for feat in node.features:
             if isinstance(feat, FuncDeclarationNode):
@@ -50,6 +46,8 @@ class VarCollector:
     @visitor.when(AttrDeclarationNode)
     def visit(self, node, scope):
         scope.define_attribute(self.current_type.get_attribute(node.id))
+        if node.type == 'SELF_TYPE':
+            scope.find_variable(node.id).type = self.current_type
 
         
     @visitor.when(FuncDeclarationNode)
@@ -66,7 +64,14 @@ class VarCollector:
 
         # Añadir las variables de argumento
         for pname, ptype in node.params:
-            new_scope.define_variable(pname, self._get_type(ptype))
+            if ptype == 'SELF_TYPE':
+                new_scope.define_variable(pname, self.current_type)
+                self.current_type.change_type(self.current_method, pname, self.current_type)
+            else:
+                new_scope.define_variable(pname, self._get_type(ptype))
+
+        if node.type == 'SELF_TYPE':
+            self.current_method.return_type = self.current_type
             
         self.visit(node.body, new_scope)
   
@@ -76,7 +81,7 @@ class VarCollector:
             return self.context.get_type(ntype)
         except SemanticError as e:
             self.errors.append(e.text)
-            return ErrorType()
+            return self.context.error_type
         
     
     @visitor.when(VarDeclarationNode)
@@ -87,11 +92,11 @@ class VarCollector:
         
         if scope.is_defined(node.id):
             var = scope.find_variable(node.id)
-            if var.type != ErrorType():
+            if var.type != self.context.error_type:
                 self.errors.append(LOCAL_ALREADY_DEFINED %(node.id, self.current_method.name))        
             return
 
-        vtype = self._get_type(node.type)
+        vtype = self.current_type if node.type == 'SELF_TYPE' else self._get_type(node.type)
         var_info = scope.define_variable(node.id, vtype)
        
         if node.expr != None:
@@ -106,7 +111,7 @@ class VarCollector:
         vinfo = scope.find_variable(node.id)
         if vinfo is None:
             self.errors.append(VARIABLE_NOT_DEFINED %(node.id, self.current_method.name))
-            vtype = ErrorType()
+            vtype = self.context.error_type
             scope.define_variable(node.id, vtype)
         else:
             vtype = vinfo.type
@@ -144,7 +149,7 @@ class VarCollector:
     def visit(self, node, scope):
         if not scope.is_defined(node.lex):
             self.errors.append(VARIABLE_NOT_DEFINED %(node.lex, self.current_method.name))
-            vinfo = scope.define_variable(node.lex, ErrorType())
+            vinfo = scope.define_variable(node.lex, self.context.error_type)
         else:
             vinfo = scope.find_variable(node.lex)
         return vinfo.type
@@ -199,7 +204,7 @@ class VarCollector:
 
     @visitor.when(OptionNode)
     def visit(self, node, scope):
-        typex = self.context.get_type(node.typex)
+        typex = self.current_type if node.typex == 'SELF_TYPE' else self.context.get_type(node.typex)
         
         self.visit(node.expr, scope)
         scope.define_variable(node.id, typex)
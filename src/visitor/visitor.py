@@ -21,6 +21,7 @@
 # THE SOFTWARE.
 
 import inspect
+from types import MethodType
 
 __all__ = ['on', 'when']
 
@@ -36,40 +37,51 @@ def when(param_type):
     frame = inspect.currentframe().f_back
     func_name = fn.func_name if 'func_name' in dir(fn) else fn.__name__
     dispatcher = frame.f_locals[func_name]
-    if not isinstance(dispatcher, Dispatcher):
-      dispatcher = dispatcher.dispatcher
     dispatcher.add_target(param_type, fn)
-    def ff(*args, **kw):
-      return dispatcher(*args, **kw)
-    ff.dispatcher = dispatcher
-    return ff
+    return dispatcher
   return f
 
 
 class Dispatcher(object):
+  """
+  Calls the target registered for the class of the dispatched argument.
+
+  A class without a target of its own uses the target of its nearest base
+  class in the MRO, or the function decorated with `on` if none of them has
+  one. The resolved target is cached per concrete class, so after the
+  first call a dispatch is a single dictionary lookup.
+  """
   def __init__(self, param_name, fn):
-    frame = inspect.currentframe().f_back.f_back
-    top_level = frame.f_locals == frame.f_globals
     self.param_index = self.__argspec(fn).args.index(param_name)
     self.param_name = param_name
+    self.default = fn
     self.targets = {}
+    self.cache = {}
+
+  def __get__(self, instance, owner):
+    # Behave like a method when stored in a class
+    if instance is None:
+      return self
+    return MethodType(self, instance)
 
   def __call__(self, *args, **kw):
     typ = args[self.param_index].__class__
-    d = self.targets.get(typ)
-    if d is not None:
-      return d(*args, **kw)
-    else:
-      issub = issubclass
-      t = self.targets
-      ks = t.keys()
-      ans = [t[k](*args, **kw) for k in ks if issub(typ, k)]
-      if len(ans) == 1:
-        return ans.pop()
-      return ans
+    try:
+      target = self.cache[typ]
+    except KeyError:
+      target = self.cache[typ] = self.resolve(typ)
+    return target(*args, **kw)
+
+  def resolve(self, typ):
+    targets = self.targets
+    for cls in typ.__mro__:
+      if cls in targets:
+        return targets[cls]
+    return self.default
 
   def add_target(self, typ, target):
     self.targets[typ] = target
+    self.cache.clear()
 
   @staticmethod
   def __argspec(fn):